@@ -0,0 +1,220 @@
+#!/usr/bin/python3
+
+"""Time the construction of large option lists and containers
+
+   Copyright 2013 Florian Berger <fberger@florian-berger.de>
+
+   Builds OptionList, LMROptionList, Container and TMBContainer instances
+   of increasing size, and reports the time per item, including the
+   layout. Containers are filled using Container.extend(), and using one
+   call to Container.sub() per item.
+
+   Construction is expected to take linear time. The exit status is 1 if
+   the time per item for the largest size exceeds that of the smallest
+   size by more than the tolerance.
+
+   Usage: bulk_construction.py [-h] [--sizes SIZES] [--repeat REPEAT]
+                               [--tolerance TOLERANCE]
+"""
+
+# This file is part of planes.
+#
+# planes is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# planes is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with planes.  If not, see <http://www.gnu.org/licenses/>.
+
+import sys
+import os
+import argparse
+import time
+
+# Add current and parent directory. One of them is supposed to contain the
+# planes package.
+#
+sys.path.append("../")
+sys.path.append("./")
+
+# No window required
+#
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+
+import pygame
+import planes
+import planes.gui
+import planes.gui.lmr
+import planes.gui.tmb
+
+def option_list(size):
+    """Return an OptionList with size options.
+    """
+
+    return planes.gui.OptionList("options",
+                                 ["Option {0}".format(n) for n in range(size)],
+                                 width = 120,
+                                 lineheight = 20)
+
+def lmr_option_list(size):
+    """Return an LMROptionList with size options.
+    """
+
+    return planes.gui.lmr.LMROptionList("lmr_options",
+                                        ["Option {0}".format(n) for n in range(size)],
+                                        120)
+
+def labels(size):
+    """Return a list of size Labels.
+    """
+
+    return [planes.gui.Label("label{0}".format(n),
+                             "Label {0}".format(n),
+                             pygame.Rect((0, 0), (100 + n % 20, 20))) for n in range(size)]
+
+def container_extend(size):
+    """Return a Container filled using Container.extend().
+    """
+
+    container = planes.gui.Container("container", padding = 2)
+
+    container.extend(labels(size))
+
+    return container
+
+def container_sub(size):
+    """Return a Container filled using one Container.sub() per Label.
+    """
+
+    container = planes.gui.Container("container", padding = 2)
+
+    for label in labels(size):
+
+        container.sub(label)
+
+    return container
+
+def tmb_container_extend(size):
+    """Return a TMBContainer filled using Container.extend().
+    """
+
+    container = planes.gui.tmb.TMBContainer("container",
+                                            planes.gui.tmb.C_256_STYLE,
+                                            padding = 2)
+
+    container.extend(labels(size))
+
+    return container
+
+def tmb_container_sub(size):
+    """Return a TMBContainer filled using one Container.sub() per Label.
+    """
+
+    container = planes.gui.tmb.TMBContainer("container",
+                                            planes.gui.tmb.C_256_STYLE,
+                                            padding = 2)
+
+    for label in labels(size):
+
+        container.sub(label)
+
+    return container
+
+CASES = (("OptionList", option_list),
+         ("LMROptionList", lmr_option_list),
+         ("Container.extend", container_extend),
+         ("Container.sub", container_sub),
+         ("TMBContainer.extend", tmb_container_extend),
+         ("TMBContainer.sub", tmb_container_sub))
+
+def time_per_item(function, size, repeat):
+    """Return the best time per item of function(size) in microseconds.
+       Reading the rect of the Plane returned resolves a pending layout.
+    """
+
+    best = None
+
+    for run in range(repeat):
+
+        start = time.perf_counter()
+
+        function(size).rect
+
+        seconds = time.perf_counter() - start
+
+        if best is None or seconds < best:
+
+            best = seconds
+
+    return best * 1000000 / size
+
+def main():
+
+    parser = argparse.ArgumentParser(description = "Time the construction of large option lists and containers.")
+
+    parser.add_argument("--sizes",
+                        default = "125,250,500,1000,2000",
+                        help = "comma-separated numbers of items, default 125,250,500,1000,2000")
+
+    parser.add_argument("--repeat",
+                        type = int,
+                        default = 3,
+                        help = "number of runs, the best time is reported, default 3")
+
+    parser.add_argument("--tolerance",
+                        type = float,
+                        default = 2.0,
+                        help = "growth factor of the time per item reported as nonlinear, default 2.0")
+
+    arguments = parser.parse_args()
+
+    try:
+        sizes = sorted(int(size) for size in arguments.sizes.split(","))
+
+    except ValueError:
+
+        parser.error("invalid sizes '{0}'".format(arguments.sizes))
+
+    pygame.init()
+
+    # Plane images are converted to the display format
+    #
+    planes.HeadlessDisplay((640, 480))
+
+    print("{0:>20} {1}".format("us per item", " ".join("{0:>9}".format(size) for size in sizes)))
+
+    nonlinear = False
+
+    for name, function in CASES:
+
+        times = [time_per_item(function, size, arguments.repeat) for size in sizes]
+
+        growth = times[-1] / max(times[0], 0.001)
+
+        flag = ""
+
+        if growth > arguments.tolerance:
+
+            flag = "  NONLINEAR"
+
+            nonlinear = True
+
+        print("{0:>20} {1}  x{2:.2f}{3}".format(name,
+                                                " ".join("{0:9.1f}".format(t) for t in times),
+                                                growth,
+                                                flag))
+
+    if nonlinear:
+
+        sys.exit(1)
+
+    return
+
+if __name__ == "__main__":
+    main()
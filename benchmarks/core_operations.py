@@ -0,0 +1,463 @@
+#!/usr/bin/python3
+
+"""Time core planes operations on synthetic scenes
+
+   Copyright 2013 Florian Berger <fberger@florian-berger.de>
+
+   Builds parameterised hierarchies of Planes on a HeadlessDisplay and
+   times Plane.sub(), Plane.remove(), Display.update(), Display.render(),
+   Plane.get_plane_at(), Display.process() with scripted events and
+   Plane.destroy(). The scenes are:
+
+   wide
+       10000 sibling Planes.
+
+   deep
+       1000 nested Planes.
+
+   gui
+       100 panels of Container, TMBContainer, Label, Button, OptionList,
+       LMRButton and LMROptionList widgets.
+
+   Results are written as JSON to standard output or a file. Given a
+   baseline written earlier, the times are compared, and the exit status
+   is 1 if any of them got slower by more than the tolerance.
+
+   Usage: core_operations.py [-h] [--scale SCALE] [--repeat REPEAT]
+                             [--output FILE] [--baseline FILE]
+                             [--tolerance TOLERANCE] [SCENE ...]
+"""
+
+# This file is part of planes.
+#
+# planes is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# planes is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with planes.  If not, see <http://www.gnu.org/licenses/>.
+
+import sys
+import os
+import json
+import random
+import argparse
+import platform
+import time
+
+# Add current and parent directory. One of them is supposed to contain the
+# planes package.
+#
+sys.path.append("../")
+sys.path.append("./")
+
+# No window required
+#
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+
+import pygame
+import planes
+import planes.gui
+import planes.gui.lmr
+import planes.gui.tmb
+
+RESOLUTION = (1024, 768)
+
+# Number of calls to Display.update() and Display.render() timed per run
+#
+FRAMES = 10
+
+# Number of positions used for get_plane_at() and scripted events
+#
+POINTS = 1000
+
+# Plane.render(), Plane.get_plane_at() and Plane.destroy() recurse once per
+# level of the deep scene.
+#
+sys.setrecursionlimit(10000)
+
+def click(plane):
+    """Dummy callback.
+    """
+
+    return
+
+def wide(count):
+    """Return a Plane with count subplanes spread over the display.
+    """
+
+    root = planes.Plane("wide", pygame.Rect((0, 0), RESOLUTION))
+
+    for i in range(count):
+
+        plane = planes.Plane("plane{0}".format(i),
+                             pygame.Rect(((i * 37) % (RESOLUTION[0] - 16),
+                                          (i * 53) % (RESOLUTION[1] - 16)),
+                                         (16, 16)),
+                             highlight = True,
+                             left_click_callback = click)
+
+        plane.image.fill((i % 256, 128, 255 - i % 256))
+
+        root.sub(plane)
+
+    return root
+
+def deep(count):
+    """Return a chain of count nested Planes.
+    """
+
+    root = plane = planes.Plane("deep", pygame.Rect((0, 0), (200, 200)))
+
+    for i in range(count):
+
+        subplane = planes.Plane("plane{0}".format(i),
+                                pygame.Rect((0, 0), (200, 200)),
+                                highlight = True,
+                                left_click_callback = click)
+
+        subplane.image.fill((i % 256, 128, 255 - i % 256))
+
+        plane.sub(subplane)
+
+        plane = subplane
+
+    return root
+
+def gui(count):
+    """Return a Plane with count panels of GUI widgets.
+    """
+
+    root = planes.Plane("gui", pygame.Rect((0, 0), RESOLUTION))
+
+    for i in range(count):
+
+        if i % 2:
+
+            panel = planes.gui.Container("panel{0}".format(i),
+                                         padding = 2,
+                                         background_color = (64, 64, 64))
+
+        else:
+            panel = planes.gui.tmb.TMBContainer("panel{0}".format(i),
+                                                planes.gui.tmb.C_256_STYLE,
+                                                padding = 2)
+
+        panel.sub(planes.gui.Label("label",
+                                   "Panel {0}".format(i),
+                                   pygame.Rect((0, 0), (120, 20))))
+
+        panel.sub(planes.gui.Button("Button",
+                                    pygame.Rect((0, 0), (80, 24)),
+                                    click))
+
+        panel.sub(planes.gui.lmr.LMRButton("LMR Button", 100, click))
+
+        panel.sub(planes.gui.OptionList("options",
+                                        ["Option {0}".format(n) for n in range(5)],
+                                        width = 120,
+                                        lineheight = 20))
+
+        panel.sub(planes.gui.lmr.LMROptionList("lmr_options",
+                                               ["LMR Option {0}".format(n) for n in range(5)],
+                                               120))
+
+        panel.rect.topleft = ((i * 37) % (RESOLUTION[0] - 256),
+                              (i * 53) % (RESOLUTION[1] - 200))
+
+        root.sub(panel)
+
+    return root
+
+SCENES = {"wide": (wide, 10000),
+          "deep": (deep, 1000),
+          "gui": (gui, 100)}
+
+OPERATIONS = ("sub", "update", "render", "get_plane_at", "process", "remove", "destroy")
+
+def all_planes(root):
+    """Return a list of all Planes below root, subplanes before their parents.
+    """
+
+    plane_list = []
+
+    pending_planes = list(root.subplanes.values())
+
+    while pending_planes:
+
+        plane = pending_planes.pop()
+
+        plane_list.append(plane)
+
+        pending_planes.extend(plane.subplanes.values())
+
+    plane_list.reverse()
+
+    return plane_list
+
+def mouse_event(event_type, position):
+    """Return a synthetic mouse event for the left button at position.
+    """
+
+    if event_type == pygame.MOUSEMOTION:
+
+        return pygame.event.Event(event_type,
+                                  pos = position,
+                                  rel = (0, 0),
+                                  buttons = (0, 0, 0))
+
+    return pygame.event.Event(event_type, pos = position, button = 1)
+
+def timed(function, *args):
+    """Call function with the arguments given, and return the time taken in milliseconds.
+    """
+
+    start = time.perf_counter()
+
+    function(*args)
+
+    return (time.perf_counter() - start) * 1000
+
+def run_once(display, build, size, positions):
+    """Build a scene on display and time all operations once.
+       Returns a dict mapping operation names to milliseconds.
+    """
+
+    times = {}
+
+    start = time.perf_counter()
+
+    root = build(size)
+
+    display.sub(root)
+
+    times["sub"] = (time.perf_counter() - start) * 1000
+
+    # Let Planes settle, and collect caches
+    #
+    display.update()
+
+    display.render(force = True)
+
+    times["update"] = sum(timed(display.update) for i in range(FRAMES)) / FRAMES
+
+    times["render"] = sum(timed(display.render, True) for i in range(FRAMES)) / FRAMES
+
+    def hit_test():
+
+        for position in positions:
+
+            display.get_plane_at(position)
+
+        return
+
+    times["get_plane_at"] = timed(hit_test)
+
+    events = []
+
+    for position in positions[:POINTS // 10]:
+
+        events.append([mouse_event(pygame.MOUSEMOTION, position)])
+
+        # No events, to process mouseover
+        #
+        events.append([])
+
+        events.append([mouse_event(pygame.MOUSEBUTTONDOWN, position)])
+
+        events.append([mouse_event(pygame.MOUSEBUTTONUP, position)])
+
+    def process():
+
+        for event_list in events:
+
+            display.process(event_list)
+
+        return
+
+    times["process"] = timed(process)
+
+    plane_list = all_planes(root)
+
+    def remove():
+
+        for plane in plane_list:
+
+            if plane.parent is not None:
+
+                plane.parent.remove(plane)
+
+        display.remove(root)
+
+        return
+
+    times["remove"] = timed(remove)
+
+    root = build(size)
+
+    display.sub(root)
+
+    times["destroy"] = timed(root.destroy)
+
+    return times
+
+def run_scene(name, scale, repeat):
+    """Time all operations on the scene given, and return a dict of results, using the best of repeat runs.
+    """
+
+    build, size = SCENES[name]
+
+    size = max(1, int(size * scale))
+
+    display = planes.HeadlessDisplay(RESOLUTION)
+
+    randomiser = random.Random(0)
+
+    positions = [(randomiser.randrange(RESOLUTION[0]),
+                  randomiser.randrange(RESOLUTION[1])) for i in range(POINTS)]
+
+    results = {"size": size,
+               "planes": build(size).count_planes()}
+
+    for run in range(repeat):
+
+        for operation, milliseconds in run_once(display, build, size, positions).items():
+
+            if operation not in results or milliseconds < results[operation]:
+
+                results[operation] = milliseconds
+
+    return results
+
+def compare(results, baseline, tolerance):
+    """Print a comparison of results to baseline to STDERR.
+       Returns True if any time got slower by more than the factor
+       tolerance.
+    """
+
+    regression = False
+
+    for scene, scene_results in sorted(results["scenes"].items()):
+
+        baseline_results = baseline["scenes"].get(scene)
+
+        if baseline_results is None or baseline_results["size"] != scene_results["size"]:
+
+            sys.stderr.write("{0}: no comparable baseline\n".format(scene))
+
+            continue
+
+        for operation in OPERATIONS:
+
+            if operation not in baseline_results:
+
+                continue
+
+            ratio = scene_results[operation] / max(baseline_results[operation], 0.001)
+
+            flag = ""
+
+            if ratio > tolerance:
+
+                flag = "  REGRESSION"
+
+                regression = True
+
+            sys.stderr.write("{0:>5} {1:>12}: {2:10.2f} ms, baseline {3:10.2f} ms, x{4:.2f}{5}\n".format(scene,
+                                                                                                        operation,
+                                                                                                        scene_results[operation],
+                                                                                                        baseline_results[operation],
+                                                                                                        ratio,
+                                                                                                        flag))
+
+    return regression
+
+def main():
+
+    parser = argparse.ArgumentParser(description = "Time core planes operations on synthetic scenes.")
+
+    parser.add_argument("scenes",
+                        metavar = "SCENE",
+                        nargs = "*",
+                        help = "scenes to run: wide, deep, gui. Default: all")
+
+    parser.add_argument("--scale",
+                        type = float,
+                        default = 1.0,
+                        help = "factor for the scene sizes, default 1.0")
+
+    parser.add_argument("--repeat",
+                        type = int,
+                        default = 3,
+                        help = "number of runs, the best time is reported, default 3")
+
+    parser.add_argument("--output",
+                        metavar = "FILE",
+                        help = "write JSON results to FILE instead of STDOUT")
+
+    parser.add_argument("--baseline",
+                        metavar = "FILE",
+                        help = "compare to JSON results written earlier")
+
+    parser.add_argument("--tolerance",
+                        type = float,
+                        default = 1.25,
+                        help = "slowdown factor reported as a regression, default 1.25")
+
+    arguments = parser.parse_args()
+
+    scenes = arguments.scenes or sorted(SCENES.keys())
+
+    for scene in scenes:
+
+        if scene not in SCENES:
+
+            parser.error("unknown scene '{0}'".format(scene))
+
+    pygame.init()
+
+    results = {"planes": planes.VERSION,
+               "python": platform.python_version(),
+               "pygame": pygame.version.ver,
+               "scale": arguments.scale,
+               "repeat": arguments.repeat,
+               "times": "milliseconds; update and render per frame, others per batch",
+               "scenes": {}}
+
+    for scene in scenes:
+
+        sys.stderr.write("Running {0}\n".format(scene))
+
+        results["scenes"][scene] = run_scene(scene, arguments.scale, arguments.repeat)
+
+    output = json.dumps(results, indent = 4, sort_keys = True)
+
+    if arguments.output is None:
+
+        print(output)
+
+    else:
+        with open(arguments.output, "w") as output_file:
+
+            output_file.write(output + "\n")
+
+    if arguments.baseline is not None:
+
+        with open(arguments.baseline) as baseline_file:
+
+            baseline = json.load(baseline_file)
+
+        if compare(results, baseline, arguments.tolerance):
+
+            sys.exit(1)
+
+    return
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,264 @@
+#!/usr/bin/python3
+
+"""Measure the cost of planes runtime statistics
+
+   Copyright 2013 Florian Berger <fberger@florian-berger.de>
+
+   Times Display.update() and Display.render() on the scenes of
+   core_operations.py in three configurations:
+
+   instrumented
+       The instrumented Plane.render() and Plane.update() installed
+       while STATS is disabled, as in a build that always collects
+       statistics instead of swapping methods.
+
+   disabled
+       The default, after STATS has been enabled and disabled again.
+
+   enabled
+       With STATS enabled, as while the statistics overlay is shown or a
+       TelemetryServer is running.
+
+   The configurations are run interleaved, and the best time of all
+   frames and runs is reported. The exit status is 1 if disabling STATS
+   does not install the uninstrumented methods, or if the disabled
+   configuration is slower than the instrumented one by more than the
+   tolerance.
+
+   There is no build without statistics to compare against. The check
+   that disabling STATS installs Plane._render_lean() and
+   Plane._update_lean() is what shows that no statistics are collected
+   then. These share their drawing loop with the instrumented methods,
+   which leaves one test per subplane whether to count anything.
+
+   Usage: instrumentation_overhead.py [-h] [--scale SCALE] [--repeat REPEAT]
+                                      [--tolerance TOLERANCE] [SCENE ...]
+"""
+
+# This file is part of planes.
+#
+# planes is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# planes is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with planes.  If not, see <http://www.gnu.org/licenses/>.
+
+import sys
+import os
+import argparse
+import time
+
+# Add current and parent directory. One of them is supposed to contain the
+# planes package. The directory of this script contains
+# core_operations.py.
+#
+sys.path.append("../")
+sys.path.append("./")
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+# No window required
+#
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+
+import pygame
+import planes
+import core_operations
+
+CONFIGURATIONS = ("instrumented", "disabled", "enabled")
+
+# Number of calls to Display.update() and Display.render() per run. The
+# fastest one is taken.
+#
+FRAMES = 20
+
+def configure(configuration, display):
+    """Set up planes for the configuration given.
+       Returns False if the disabled configuration does not use the
+       uninstrumented methods.
+    """
+
+    planes.STATS.enable(display)
+
+    if configuration == "enabled":
+
+        return True
+
+    # Go through the public API, as an application would
+    #
+    planes.STATS.disable(display)
+
+    if configuration == "instrumented":
+
+        # Keep instrumenting, bypassing the swap
+        #
+        planes.Plane.render = planes.Plane._render_instrumented
+
+        planes.Plane.update = planes.Plane._update_instrumented
+
+        return True
+
+    return (planes.Plane.render is planes.Plane._render_lean
+            and planes.Plane.update is planes.Plane._update_lean)
+
+def time_frames(display):
+    """Return the best times of Display.update() and Display.render() in milliseconds, as a tuple.
+    """
+
+    update_times = []
+
+    render_times = []
+
+    for frame in range(FRAMES):
+
+        start = time.perf_counter()
+
+        display.update()
+
+        update_times.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+
+        display.render(force = True)
+
+        render_times.append(time.perf_counter() - start)
+
+    return (min(update_times) * 1000, min(render_times) * 1000)
+
+def run_scene(name, scale, repeat):
+    """Time all configurations on the scene given.
+       Returns a dict mapping configuration names to the best (update,
+       render) times, and a flag whether the disabled configuration used
+       the uninstrumented methods.
+    """
+
+    build, size = core_operations.SCENES[name]
+
+    display = planes.HeadlessDisplay(core_operations.RESOLUTION)
+
+    display.sub(build(max(1, int(size * scale))))
+
+    # Let Planes settle, and collect caches
+    #
+    display.update()
+
+    display.render(force = True)
+
+    results = {}
+
+    uninstrumented = True
+
+    for run in range(repeat):
+
+        for configuration in CONFIGURATIONS:
+
+            if not configure(configuration, display):
+
+                uninstrumented = False
+
+            times = time_frames(display)
+
+            if configuration in results:
+
+                times = (min(times[0], results[configuration][0]),
+                         min(times[1], results[configuration][1]))
+
+            results[configuration] = times
+
+    # Leave planes as after a plain STATS.disable()
+    #
+    planes.STATS.enable(display)
+
+    planes.STATS.disable(display)
+
+    return results, uninstrumented
+
+def main():
+
+    parser = argparse.ArgumentParser(description = "Measure the cost of planes runtime statistics.")
+
+    parser.add_argument("scenes",
+                        metavar = "SCENE",
+                        nargs = "*",
+                        help = "scenes to run: wide, deep, gui. Default: all")
+
+    parser.add_argument("--scale",
+                        type = float,
+                        default = 1.0,
+                        help = "factor for the scene sizes, default 1.0")
+
+    parser.add_argument("--repeat",
+                        type = int,
+                        default = 5,
+                        help = "number of runs, the best time is reported, default 5")
+
+    parser.add_argument("--tolerance",
+                        type = float,
+                        default = 1.1,
+                        help = "slowdown factor of the disabled configuration over the instrumented one reported as a regression, default 1.1")
+
+    arguments = parser.parse_args()
+
+    scenes = arguments.scenes or sorted(core_operations.SCENES.keys())
+
+    for scene in scenes:
+
+        if scene not in core_operations.SCENES:
+
+            parser.error("unknown scene '{0}'".format(scene))
+
+    pygame.init()
+
+    regression = False
+
+    for scene in scenes:
+
+        results, uninstrumented = run_scene(scene, arguments.scale, arguments.repeat)
+
+        if not uninstrumented:
+
+            print("{0}: disabled configuration uses instrumented methods  REGRESSION".format(scene))
+
+            regression = True
+
+        for index, operation in enumerate(("update", "render")):
+
+            instrumented = results["instrumented"][index]
+
+            disabled = results["disabled"][index]
+
+            enabled = results["enabled"][index]
+
+            ratio = disabled / max(instrumented, 0.001)
+
+            flag = ""
+
+            if ratio > arguments.tolerance:
+
+                flag = "  REGRESSION"
+
+                regression = True
+
+            print("{0:>5} {1:>6}: instrumented {2:8.3f} ms, disabled {3:8.3f} ms (x{4:.2f}), enabled {5:8.3f} ms (x{6:.2f}){7}".format(scene,
+                                                                                                                                operation,
+                                                                                                                                instrumented,
+                                                                                                                                disabled,
+                                                                                                                                ratio,
+                                                                                                                                enabled,
+                                                                                                                                enabled / max(instrumented, 0.001),
+                                                                                                                                flag))
+
+    if regression:
+
+        sys.exit(1)
+
+    return
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+#!/usr/bin/python3
+
+"""Measure the memory used per Plane
+
+   Copyright 2013 Florian Berger <fberger@florian-berger.de>
+
+   Builds hierarchies of Planes and prints the number of bytes allocated
+   per Plane, as traced by the tracemalloc module. Pixel data of the Plane
+   images is allocated by SDL and not included.
+
+   Usage: plane_memory.py [-h] [PLANES]
+"""
+
+# This file is part of planes.
+#
+# planes is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# planes is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with planes.  If not, see <http://www.gnu.org/licenses/>.
+
+import sys
+import os
+import argparse
+import gc
+import tracemalloc
+
+# Add current and parent directory. One of them is supposed to contain the
+# planes package.
+#
+sys.path.append("../")
+sys.path.append("./")
+
+# No window required
+#
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+
+import pygame
+import planes
+
+def click(plane):
+    """Dummy callback.
+    """
+
+    return
+
+def flat(count):
+    """Return a Plane with count subplanes.
+    """
+
+    root = planes.Plane("root", pygame.Rect((0, 0), (1000, 1000)))
+
+    for i in range(count):
+
+        root.sub(planes.Plane("plane{0}".format(i),
+                              pygame.Rect((i % 1000, i // 1000), (1, 1))))
+
+    return root
+
+def with_callbacks(count):
+    """Return a Plane with count subplanes that have a click callback set.
+    """
+
+    root = planes.Plane("root", pygame.Rect((0, 0), (1000, 1000)))
+
+    for i in range(count):
+
+        root.sub(planes.Plane("plane{0}".format(i),
+                              pygame.Rect((i % 1000, i // 1000), (1, 1)),
+                              left_click_callback = click))
+
+    return root
+
+def nested(count):
+    """Return a chain of count Planes, each one a subplane of the previous.
+    """
+
+    root = plane = planes.Plane("root", pygame.Rect((0, 0), (1, 1)))
+
+    for i in range(count):
+
+        subplane = planes.Plane("plane{0}".format(i), pygame.Rect((0, 0), (1, 1)))
+
+        plane.sub(subplane)
+
+        plane = subplane
+
+    return root
+
+def measure(build, count):
+    """Return the number of bytes allocated per Plane by build(count).
+    """
+
+    gc.collect()
+
+    tracemalloc.start()
+
+    before = tracemalloc.get_traced_memory()[0]
+
+    root = build(count)
+
+    gc.collect()
+
+    after = tracemalloc.get_traced_memory()[0]
+
+    tracemalloc.stop()
+
+    return (after - before) / float(count)
+
+def main():
+
+    parser = argparse.ArgumentParser(description = "Measure the memory used per Plane.")
+
+    parser.add_argument("planes",
+                        metavar = "PLANES",
+                        type = int,
+                        nargs = "?",
+                        default = 20000,
+                        help = "number of Planes to build, default 20000")
+
+    arguments = parser.parse_args()
+
+    count = arguments.planes
+
+    if count < 1:
+
+        parser.error("PLANES must be at least 1")
+
+    pygame.init()
+
+    print("planes {0}, Python {1}, {2} Planes".format(planes.VERSION,
+                                                     sys.version.split()[0],
+                                                     count))
+
+    for build in (flat, with_callbacks, nested):
+
+        print("{0:>16}: {1:.0f} bytes per Plane".format(build.__name__,
+                                                        measure(build, count)))
+
+    return
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,181 @@
+#!/usr/bin/python3
+
+"""Count the Surfaces allocated per frame by redrawing widgets
+
+   Copyright 2013 Florian Berger <fberger@florian-berger.de>
+
+   Builds a scene of ProgressBars, Containers and TMBContainers. In every
+   frame, the ProgressBars advance, and the Containers are laid out and
+   redrawn again at their current size. Prints STATS.surface_allocations
+   after Display.update() and the time per frame.
+
+   The first frames allocate the widget images. The exit status is 1 if
+   any frame after the warmup allocates a Surface.
+
+   Usage: surface_allocations.py [-h] [--frames FRAMES] [--warmup WARMUP]
+                                 [--widgets WIDGETS]
+"""
+
+# This file is part of planes.
+#
+# planes is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# planes is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with planes.  If not, see <http://www.gnu.org/licenses/>.
+
+import sys
+import os
+import argparse
+import time
+
+# Add current and parent directory. One of them is supposed to contain the
+# planes package.
+#
+sys.path.append("../")
+sys.path.append("./")
+
+# No window required
+#
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+
+import pygame
+import planes
+import planes.gui
+import planes.gui.tmb
+
+RESOLUTION = (800, 600)
+
+def build(display, widgets):
+    """Add widgets ProgressBars, Containers and TMBContainers each to display.
+       Returns a list of all widgets.
+    """
+
+    widget_list = []
+
+    for n in range(widgets):
+
+        y = n * 30 % (RESOLUTION[1] - 30)
+
+        bar = planes.gui.ProgressBar("bar{0}".format(n),
+                                     pygame.Rect((10, y), (200, 20)),
+                                     0)
+
+        container = planes.gui.Container("container{0}".format(n),
+                                         padding = 2,
+                                         background_color = (64, 64, 64, 128))
+
+        container.sub(planes.gui.Label("label", "Container {0}".format(n), pygame.Rect((0, 0), (120, 20))))
+
+        container.rect.topleft = (230, y)
+
+        tmb_container = planes.gui.tmb.TMBContainer("tmb_container{0}".format(n),
+                                                    planes.gui.tmb.C_256_STYLE,
+                                                    padding = 2,
+                                                    colorkey = (0, 255, 0))
+
+        tmb_container.sub(planes.gui.Label("label", "TMBContainer {0}".format(n), pygame.Rect((0, 0), (120, 20))))
+
+        tmb_container.rect.topleft = (400, y)
+
+        for widget in (bar, container, tmb_container):
+
+            display.sub(widget)
+
+            widget_list.append(widget)
+
+    return widget_list
+
+def step(widget_list, frame):
+    """Advance all ProgressBars, and have all Containers lay out again.
+    """
+
+    for widget in widget_list:
+
+        if isinstance(widget, planes.gui.ProgressBar):
+
+            widget.percent = frame % 101
+
+        else:
+            widget.request_layout()
+
+    return
+
+def main():
+
+    parser = argparse.ArgumentParser(description = "Count the Surfaces allocated per frame by redrawing widgets.")
+
+    parser.add_argument("--frames",
+                        type = int,
+                        default = 100,
+                        help = "number of frames, default 100")
+
+    parser.add_argument("--warmup",
+                        type = int,
+                        default = 1,
+                        help = "number of frames that may allocate, default 1")
+
+    parser.add_argument("--widgets",
+                        type = int,
+                        default = 10,
+                        help = "number of widgets of each kind, default 10")
+
+    arguments = parser.parse_args()
+
+    if arguments.frames <= arguments.warmup:
+
+        parser.error("--frames must be larger than --warmup")
+
+    pygame.init()
+
+    display = planes.HeadlessDisplay(RESOLUTION)
+
+    widget_list = build(display, arguments.widgets)
+
+    allocations = []
+
+    start = time.perf_counter()
+
+    for frame in range(arguments.frames):
+
+        step(widget_list, frame)
+
+        display.update()
+
+        allocations.append(planes.STATS.surface_allocations)
+
+        display.render()
+
+    seconds = time.perf_counter() - start
+
+    steady_allocations = sum(allocations[arguments.warmup:])
+
+    flag = ""
+
+    if steady_allocations:
+
+        flag = "  REGRESSION"
+
+    print("warmup: {0} Surfaces allocated in {1} frames".format(sum(allocations[:arguments.warmup]),
+                                                               arguments.warmup))
+
+    print("steady state: {0} Surfaces allocated in {1} frames, {2:.3f} ms per frame{3}".format(steady_allocations,
+                                                                                               arguments.frames - arguments.warmup,
+                                                                                               seconds * 1000 / arguments.frames,
+                                                                                               flag))
+
+    if steady_allocations:
+
+        sys.exit(1)
+
+    return
+
+if __name__ == "__main__":
+    main()
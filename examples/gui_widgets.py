@@ -266,29 +266,13 @@ def mainloop(display, framerate):
 
     print("about to start main loop")
 
-    clock = pygame.time.Clock()
+    display.run(updates_per_second = framerate, max_fps = framerate)
 
-    while True:
-        events = pygame.event.get()
+    print("got pygame.QUIT, terminating in mainloop()")
 
-        for event in events:
+    pygame.quit()
 
-            if event.type == pygame.QUIT:
-                print("got pygame.QUIT, terminating in mainloop()")
-                pygame.quit()
-                raise SystemExit
-
-        display.process(events)
-        display.update()
-        display.render()
-
-        pygame.display.flip()
-
-        # Slow down to framerate given
-        #
-        clock.tick(framerate)
-
-    return
+    raise SystemExit
 
 def main():
     """Main method.
@@ -76,8 +76,10 @@ container.rect.topleft = (250, 50)
 textbox = planes.gui.TextBox("textbox", pygame.Rect((10, 10), (200, 30)))
 window.key_sensitive(textbox)
 
-clock = pygame.time.Clock()
-fps = clock.get_fps
+def fps():
+    """Return the current framerate of the main loop.
+    """
+    return window.clock.get_fps()
 
 helptext = """---------------------------------------------------------------------------
 You can now interact with planes.
@@ -113,25 +115,11 @@ def mainloop(framerate):
 
     print("about to start main loop")
 
-    while True:
-        events = pygame.event.get()
-
-        for event in events:
-
-            if event.type == pygame.QUIT:
-                print("got pygame.QUIT, terminating in mainloop()")
-                pygame.quit()
-                raise SystemExit
-
-        window.process(events)
-        window.update()
-        window.render()
-
-        pygame.display.flip()
+    window.run(updates_per_second = framerate, max_fps = framerate)
 
-        # Slow down to framerate given
-        #
-        clock.tick(framerate)
+    print("got pygame.QUIT, terminating in mainloop()")
+    pygame.quit()
+    raise SystemExit
 
 def run_interactive_console(locals_dict):
 
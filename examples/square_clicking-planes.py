@@ -112,9 +112,6 @@ class DropDisplay(planes.Display):
 def main():
 	pygame.init()
 
-	print("setting up clock")
-	clock = pygame.time.Clock()
-
 	# main screen
 	#
 	print("creating main screen")
@@ -137,25 +134,12 @@ def main():
 	#
 	print("starting main loop")
 
-	while True:
-		events = pygame.event.get()
-
-		for event in events:
-
-			if event.type == pygame.QUIT:
-				print("got pygame.QUIT, terminating")
-				raise SystemExit
-
-		screen.process(events)
-		screen.update()
-		screen.render()
-
-		pygame.display.flip()
+	# Display.run() handles pygame.QUIT, and runs update() at 60 steps per
+	# second regardless of the frame rate
+	#
+	screen.run(updates_per_second = 60, max_fps = 60)
 
-		# run at 60 fps
-		#
-		clock.tick(60)
-		#print(clock.get_fps())
+	print("got pygame.QUIT, terminating")
 
 if __name__ == "__main__":
 	main()
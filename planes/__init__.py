@@ -21,15 +21,17 @@
 # Planned in mind at the Mosel valley in late July 2010
 # Actual work started on 01. Oct 2010
 
-# TODO: add Plane.offset(x, y) to offset all subplanes - without touching their rect -> only while rendering
 # TODO: Surface.get_flags has all sorts of interesting information to optimise performance.
-# TODO: Planes *so* needs live performance reporting. Maybe not via log file, but as some sort of a live display via TTY or socket.
-# TODO: replace Plane.subplanes and Planes.subplanes_list with collections.OrderedDict and OrderedDict.keys()?
 
 import pygame
 import time
 import random
 import platform
+import bisect
+import os
+import collections
+import heapq
+import weakref
 
 VERSION = "0.6.1"
 
@@ -38,1002 +40,3256 @@ VERSION = "0.6.1"
 #
 TIMER_FUNC = None
 
-if platform.system().lower() == "windows":
+# time.perf_counter() is monotonic and available since Python 3.3.
+# time.clock() has been removed in Python 3.8.
+#
+if hasattr(time, "perf_counter"):
+
+    TIMER_FUNC = time.perf_counter
+
+elif platform.system().lower() == "windows" and hasattr(time, "clock"):
 
     TIMER_FUNC = time.clock
 
 else:
     TIMER_FUNC = time.time
 
-class Plane:
-    """A Plane is a surface in a hierarchy of surfaces.
-       Concept-wise it bears some similarities to pygame.sprite.Sprite.
-
-       Planes are currently not thread safe! Accessing a Plane from several
-       threads may produce unexpected results and errors.
-
-       Attributes:
+# Monotonic timer returning integer nanoseconds, used for profiling while
+# STATS.enabled is True, and by planes.trace.
+#
+if hasattr(time, "perf_counter_ns"):
 
-       Plane.name
-           Name of the plane.
+    PROFILING_TIMER_FUNC = time.perf_counter_ns
 
-       Plane.image
-           The pygame.Surface for this Plane.
+else:
+    def PROFILING_TIMER_FUNC():
+        """Return TIMER_FUNC() in integer nanoseconds.
+        """
 
-       Plane.rect
-           The render position of this Plane on the parent Plane.
+        return int(TIMER_FUNC() * 1000000000)
 
-       Plane.parent
-           The parent plane. Initially None.
+# Planes with at least this many subplanes use a SpatialIndex in
+# Plane.get_plane_at().
+#
+SPATIAL_INDEX_THRESHOLD = 32
 
-       Plane.subplanes
-           Dict of subplanes, identified by their name.
+# Incremented whenever a Plane is added, removed, or found to be moved or
+# resized on the display. Used to skip mouseover hit testing in
+# Display.process() when nothing has changed.
+#
+GEOMETRY_VERSION = 0
 
-       Plane.subplanes_list
-           A list of subplane names, in order of their addition
+# True while Display.render() draws without having collected damage, i.e.
+# without dirty rendering. Plane._render_subplanes() then checks cached
+# composites itself, see Plane.check_composite().
+#
+_CHECK_COMPOSITES = False
 
-       Plane.draggable
-           Boolean flag. If True, this Plane can be dragged and dropped.
+class OrderedPlanes(object):
+    """An ordered collection of Planes, keyed by name.
 
-       Plane.grab
-           Boolean flag. If True, this Plane will remove dropped Planes from
-           their parent Plane and make it a subplane of this one.
-           Handled in Plane.dropped_upon()
+       This is the type of Plane.subplanes. It can be used like a read-only
+       dict, iterating over names in render order. Use Plane.sub() and
+       Plane.remove() to change the subplanes of a Plane.
 
-       Plane.highlight
-           Boolean flag. If True, the Plane be highlighted when the mouse cursor
-           moves over it.
+       Planes are kept sorted by Plane.layer. Within a layer, they are in
+       order of their addition, unless inserted before or after a given
+       name, which makes the new Plane join the layer of that Plane.
 
-       Plane.last_image_id
-           Caches object id of the image at last rendering for efficiency.
+       Internally, this is a doubly linked list with a dict for lookup, so
+       inserting before or after a name, removing and looking up by name
+       are O(1). The first and last node of each layer are tracked along
+       with a sorted list of layers, so adding a Plane at either end of its
+       layer is O(log n) in the number of layers. Tuples of names and
+       Planes in order are cached until the collection changes.
 
-       Plane.last_rect
-           Caches rect at last rendering for efficiency.
+       Planes without subplanes share the empty collection NO_SUBPLANES.
+    """
 
-       Plane.left_click_callback
-           Callback function when this plane has been clicked with the left
-           mouse button.
+    __slots__ = ("_nodes", "_root", "_layers", "_layer_list", "_planes", "_names")
 
-       Plane.right_click_callback
-           Callback function when this plane has been clicked with the right
-           mouse button.
+    def __init__(self):
+        """Initialise an empty collection.
+        """
 
-       Plane.up_click_callback
-           Callback function when the mouse wheel has been moved up above this
-           Plane.
+        # {<name> : [<previous node>, <next node>, <plane>]}
+        #
+        self._nodes = {}
 
-       Plane.down_click_callback
-           Callback function when the mouse wheel has been moved down above this
-           Plane.
+        # Sentinel node, linking to the last and first node
+        #
+        self._root = root = []
 
-       Plane.dropped_upon_callback
-           Callback function when a plane has been dropped upon this plane.
+        root[:] = [root, root, None]
 
-       Plane.mouseover_callback
-           Callback function when the mouse cursor moves over this plane.
+        # {<layer> : [<first node>, <last node>]}
+        #
+        self._layers = {}
 
-       Plane.mouseout_callback
-           Callback function when the mouse cursor has left this plane.
+        # Sorted list of the keys of self._layers
+        #
+        self._layer_list = []
 
-       Plane.mouseover
-           Flag indicating whether the mouse cursor is over this Plane.
-           Initially False.
+        self._planes = ()
 
-       Plane.sync_master_plane
-          A Plane that this Plane's position will sync to. Initally None.
+        self._names = ()
 
-       Plane.offset
-          A tuple (x, y) describing the offset to the sync master plane.
-          Initially None.
-    """
+        return
 
-    # TODO: it should be possible to initialise a Plane with a Pygame Surface, for convenvience.
-    #
-    def __init__(self,
-                 name,
-                 rect,
-                 draggable = False,
-                 grab = False,
-                 highlight = False,
-                 left_click_callback = None,
-                 right_click_callback = None,
-                 up_click_callback = None,
-                 down_click_callback = None,
-                 dropped_upon_callback = None):
-        """Initialize the Plane.
-           name is the name of the plane which can also be used
-           as an attribute.
-           rect is an instance of pygame.Rect giving width, height
-           and render position.
-           draggable is a flag indicating whether this plane can be dragged.
-           grab is a flag indicating whether other planes can be dropped
-           on this one.
-           clicked_callback and dropped_upon_callback, if given, must be
-           functions.
-           Planes are filled with solid black color by default.
+    def _link(self, plane, next_node):
+        """Insert a new node for plane immediately before next_node, and return the new node.
         """
 
-        self.name = name
+        previous_node = next_node[0]
 
-        # We do not use the SRCALPHA flag because it considerably slows down the
-        # rendering. If an application needs per-pixel alpha, it can always
-        # substitute Plane.image with an RGBA Surface.
-        #
-        self.image = pygame.Surface(rect.size, flags = pygame.HWSURFACE)
+        node = [previous_node, next_node, plane]
 
-        # Transparent by default, so let's paint it black
-        #
-        self.image.fill((0, 0, 0, 255))
+        previous_node[1] = next_node[0] = node
 
-        # Rect is relative to the parent plane, not to the display!
-        #
-        self.rect = rect
+        self._nodes[plane.name] = node
 
-        self.draggable = draggable
-        self.grab = grab
+        self._planes = self._names = None
 
-        self.highlight = highlight
-        self.mouseover = False
+        return node
 
-        # Parent stores the parent plane.
-        # Upon creation, there is none.
-        #
-        self.parent = None
+    def _add_layer(self, plane):
+        """Add plane as the only Plane of a new layer.
+        """
 
-        self.subplanes = {}
-        self.subplanes_list = []
+        layer = plane._layer
 
-        # Caches for efficient rendering
-        #
-        self.last_image_id = id(self.image)
+        index = bisect.bisect(self._layer_list, layer)
 
-        # Initialize to None to trigger a rendering
-        #
-        self.last_rect = None
+        next_node = self._root
 
-        # Save callbacks
-        #
-        self.left_click_callback = left_click_callback
-        self.right_click_callback = right_click_callback
-        self.up_click_callback = up_click_callback
-        self.down_click_callback = down_click_callback
-        self.dropped_upon_callback = dropped_upon_callback
+        if index < len(self._layer_list):
 
-        # Master plane for synchronous movements
-        #
-        self.sync_master_plane = None
-        self.offset = None
+            next_node = self._layers[self._layer_list[index]][0]
 
-        return
+        node = self._link(plane, next_node)
 
-    def sub(self, plane, insert_after = None, insert_before = None):
-        """Remove the Plane given from its current parent and add it as a subplane of this Plane.
+        self._layer_list.insert(index, layer)
 
-           If insert_after is given, the new subplane will be inserted
-           immediately after the subplane with that name in Plane.subplanes_list.
+        self._layers[layer] = [node, node]
 
-           If insert_before is given, it will be inserter immediately
-           before the subplane with the name given.
-        
-           Else it will simply be appended.
+        return
 
-           If a subplane with the same name already exists, it is silently
-           replaced by the new plane.
+    def append(self, plane):
+        """Add plane as the last item of its layer.
         """
 
-        if plane.parent is not None:
-
-            plane.parent.remove(plane.name)
-
-        if plane.name in self.subplanes_list:
+        bounds = self._layers.get(plane._layer)
 
-            del self.subplanes_list[self.subplanes_list.index(plane.name)]
+        if bounds is None:
 
-        if insert_after is not None and insert_after in self.subplanes_list:
+            self._add_layer(plane)
 
-            self.subplanes_list.insert(self.subplanes_list.index(insert_after) + 1,
-                                       plane.name)
+        else:
+            bounds[1] = self._link(plane, bounds[1][1])
 
-        elif insert_before is not None and insert_before in self.subplanes_list:
+        return
 
-            self.subplanes_list.insert(self.subplanes_list.index(insert_before),
-                                       plane.name)
+    def prepend(self, plane):
+        """Add plane as the first item of its layer.
+        """
 
-        else:
-            self.subplanes_list.append(plane.name)
+        bounds = self._layers.get(plane._layer)
 
-        self.subplanes[plane.name] = plane
+        if bounds is None:
 
-        plane.parent = self
+            self._add_layer(plane)
 
-        # Reset to None to trigger a rendering
-        #
-        plane.last_rect = None
+        else:
+            bounds[0] = self._link(plane, bounds[0])
 
         return
 
-    def remove(self, plane_identifier):
-        """Remove subplane by name or Plane instance.
+    def insert_after(self, name, plane):
+        """Add plane immediately after the Plane called name, setting its layer to the layer of that Plane.
         """
 
-        # Accept Plane name as well as Plane instance
-        #
-        if isinstance(plane_identifier, Plane):
+        sibling_node = self._nodes[name]
 
-            name = plane_identifier.name
+        plane._layer = sibling_node[2]._layer
 
-        else:
-            name = plane_identifier
+        node = self._link(plane, sibling_node[1])
 
-        if name in self.subplanes_list:
-            self.subplanes[name].parent = None
-            del self.subplanes[name]
-            del self.subplanes_list[self.subplanes_list.index(name)]
+        bounds = self._layers[plane._layer]
 
-        # If there are still subplanes, then trigger a redraw of all of them
-        # by setting their last_rect to None.
-        #
-        for plane in self.subplanes.values():
+        if bounds[1] is sibling_node:
 
-            plane.last_rect = None
+            bounds[1] = node
 
         return
 
-    def remove_all(self):
-        """Convenience method to call Plane.remove() for all subplanes.
+    def insert_before(self, name, plane):
+        """Add plane immediately before the Plane called name, setting its layer to the layer of that Plane.
         """
 
-        # Make a copy since subplanes_list will be changed by remove()
-        #
-        for name in list(self.subplanes_list):
+        sibling_node = self._nodes[name]
 
-            self.remove(name)
+        plane._layer = sibling_node[2]._layer
 
-        return
+        node = self._link(plane, sibling_node)
 
-    def __getattr__(self, name):
-        """Access subplanes as attributes.
-        """
+        bounds = self._layers[plane._layer]
 
-        # The Python interpreter has already checked instance and class
-        # attributes. If this fails, an appropriate KeyError will be raised.
-        #
-        return self.subplanes[name]
+        if bounds[0] is sibling_node:
 
-    def render(self, rendersurface, offset_rect):
-        """Draw a composite surface of this plane and all subplanes, in order of their addition.
+            bounds[0] = node
 
-           rendersurface is a Pygame Surface to render to.
+        return
 
-           offset_rect is a Pygame Rect giving the offset and the
-           clipping area.
-        
-           This method will highlight subplanes that have the
-           Plane.mousover flag set.
+    def remove(self, name):
+        """Remove the Plane called name from the collection and return it.
         """
 
-        # TODO: Taking the time, of course, takes time. Use in assert() and debug only?
-        #
-        timestamp = TIMER_FUNC()
-
-        STATS.total_pixels += self.rect.width * self.rect.height
+        node = self._nodes.pop(name)
 
-        # Force-blit subplanes in order. Obey mouseover flag.
-        # Unconditionally redraw everything.
-        #
-        # (The alternative would be to check for rect collisions to
-        # see where the background can be restored by using image, or
-        # caching inbetween rendering steps).
+        previous_node, next_node, plane = node
 
-        # Make blits look like they only affect the current surface
-        #
-        rendersurface.set_clip(offset_rect)
+        previous_node[1] = next_node
 
-        for subplane in (self.subplanes[name] for name in self.subplanes_list):
+        next_node[0] = previous_node
 
-            # First blit the image, so it forms the background
-            # for further blits of subplane-subplanes
-            #
-            rendersurface.blit(subplane.image,
-                               subplane.rect.move(offset_rect.topleft))
+        layer = plane._layer
 
-            # Add a highlight on top if mouseover is set
-            #
-            if subplane.mouseover:
+        bounds = self._layers[layer]
 
-                overlay = subplane.image.copy()
+        if bounds[0] is node and bounds[1] is node:
 
-                # Only premultiply Surfaces with the SRCALPHA flag,
-                # will raise an exception otherwise.
-                #
-                if overlay.get_flags() & 0x00010000:
+            del self._layers[layer]
 
-                    # Premultiply alpha channel to RGB.
-                    # Otherwise invisible RGB values will be
-                    # added by BLEND_ADD. Technique suggested
-                    # by Rene Dudfield <renesd@gmail.com> on
-                    # pygame-users@seul.org on 19 Dec 2011
-                    #
-                    overlay = pygame.image.fromstring(pygame.image.tostring(overlay,
-                                                                            "RGBA_PREMULT"),
-                                                      overlay.get_size(),
-                                                      "RGBA")
+            del self._layer_list[bisect.bisect_left(self._layer_list, layer)]
 
-                overlay.blit(overlay, (0, 0), special_flags = pygame.BLEND_MULT)
-                overlay.blit(overlay, (0, 0), special_flags = pygame.BLEND_MULT)
+        elif bounds[0] is node:
 
-                rendersurface.blit(overlay,
-                                   subplane.rect.move(offset_rect.topleft),
-                                   special_flags = pygame.BLEND_ADD)
+            bounds[0] = next_node
 
-            # Now recurse depth-first into subplanes of this
-            # subplane
+        elif bounds[1] is node:
 
-            subplanetimestamp = TIMER_FUNC()
+            bounds[1] = previous_node
 
-            # TODO: bookkeeping: count rendered Planes - (but isn't that done by recursion?)
+        self._planes = self._names = None
 
-            subplane.render(rendersurface,
-                            pygame.Rect((subplane.rect.x + offset_rect.x,
-                                         subplane.rect.y + offset_rect.y),
-                                        self.rect.size))
+        return plane
 
-            # Do note take render times of subplanes into account
-            #
-            timestamp += TIMER_FUNC() - subplanetimestamp
+    def values(self):
+        """Return a tuple of all Planes, in order.
+        """
 
-        # Clean up for future draw operations
-        #
-        rendersurface.set_clip(None)
+        if self._planes is None:
 
-        self.last_image_id = id(self.image)
+            planes = []
 
-        STATS.plane_times.append(((TIMER_FUNC() - timestamp)* 1000,
-                                  self.name,
-                                  len(self.subplanes_list)))
+            root = self._root
 
-        return
-        
-    def get_plane_at(self, coordinates):
-        """Return the (sub)plane and the succeeding parent coordinates at the given coordinates.
-           Subplanes are tested in reverse order of their addition (i.e. latest first).
-        """
+            node = root[1]
 
-        # It's probaly me.
-        #
-        return_plane = self
-        return_coordinates = coordinates
+            while node is not root:
 
-        for name in self.subplanes_list:
+                planes.append(node[2])
 
-            plane = self.subplanes[name]
+                node = node[1]
 
-            if plane.rect.collidepoint(coordinates):
+            self._planes = tuple(planes)
 
-                return_coordinates = (coordinates[0] - plane.rect.left, coordinates[1] - plane.rect.top)
+        return self._planes
 
-                return_plane, return_coordinates = plane.get_plane_at(return_coordinates)
+    def keys(self):
+        """Return a tuple of all names, in order.
+        """
 
-        return (return_plane, return_coordinates)
+        if self._names is None:
 
-    def update(self):
-        """Update hook. The default implementation calls update() on all subplanes.
+            self._names = tuple(plane.name for plane in self.values())
 
-           If Plane.sync_master_plane is not None, the position of this
-           Plane will be synced to that of the master Plane, using
-           Plane.offset.
+        return self._names
 
-           Compare pygame.sprite.Sprite.update.
+    def items(self):
+        """Return a list of (name, Plane) tuples, in order.
         """
 
-        # update() will be called for all planes.
-        #
-        STATS.total_planes += 1
+        return [(plane.name, plane) for plane in self.values()]
 
-        # Subplanes may be destroyed in update(). So, create a list copy in case
-        # self.subplanes changes during iteration.
-        #
-        for plane in list(self.subplanes.values()):
+    def get(self, name, default = None):
+        """Return the Plane called name, or default.
+        """
 
-            plane.update()
+        if name in self._nodes:
 
-        if self.sync_master_plane is not None:
+            return self._nodes[name][2]
 
-            self.rect.center = (self.sync_master_plane.rect.centerx + self.offset[0],
-                                self.sync_master_plane.rect.centery + self.offset[1])
+        return default
 
-        return
+    def __getitem__(self, name):
+        """Return the Plane called name. Raises a KeyError if there is none.
+        """
 
-    def del_image(self):
-        """Convenience method, replacing this Plane's image with a transparent 1px x 1px Pygame Surface.
+        return self._nodes[name][2]
 
-           Plane.rect is left as-is.
-        
-           Useful for container surfaces which have no background.
+    def __contains__(self, name):
+        """Check for a Plane called name.
         """
 
-        self.image = pygame.Surface((1, 1))
+        return name in self._nodes
 
-        self.image.set_alpha(0, pygame.RLEACCEL)
-        
-        return
-        
-    def clicked(self, button_name):
-        """Called when there is a MOUSEDOWN event on this plane.
-           If click callbacks are set, the appropriate one is called with this
-           Plane as argument.
+    def __len__(self):
+        """Return the number of Planes.
         """
 
-        if button_name == "left" and self.left_click_callback is not None:
+        return len(self._nodes)
 
-            self.left_click_callback(self)
+    def __iter__(self):
+        """Iterate over the names, in order.
+        """
 
-        elif button_name == "right" and self.right_click_callback is not None:
+        return iter(self.keys())
 
-            self.right_click_callback(self)
+    def __repr__(self):
+        """Readable string representation, like a dict.
+        """
 
-        elif button_name == "up" and self.up_click_callback is not None:
+        return "{" + ", ".join("'{0}': {1}".format(name, repr(plane)) for name, plane in self.items()) + "}"
 
-            self.up_click_callback(self)
+# Shared by all Planes that never had a subplane. Plane.sub() replaces it
+# with a new OrderedPlanes instance before adding anything.
+#
+NO_SUBPLANES = OrderedPlanes()
 
-        elif button_name == "down" and self.down_click_callback is not None:
+class PlaneNames(object):
+    """A read-only sequence view of the names in an OrderedPlanes collection.
 
-            self.down_click_callback(self)
+       This is the type of Plane.subplanes_list.
+    """
 
-        return
+    __slots__ = ("_ordered_planes",)
 
-    def dropped_upon(self, plane, coordinates):
-        """If a plane is dropped on top of this one, call dropped_upon_callback() and conditionally grab it.
+    def __init__(self, ordered_planes):
+        """Initialise.
+        """
 
-           If Plane.grab is True, the default implementation will remove the
-           dropped Plane from its parent and make it a subplane of this one.
+        self._ordered_planes = ordered_planes
 
-           If the dropped Plane is already a subplane of this one, its position
-           is updated.
+        return
 
-           If Plane.dropped_upon_callback is set, it is called with
-           Plane.dropped_upon_callback(self, plane, coordinates)
+    def index(self, name):
+        """Return the position of name in the sequence. This is O(n).
         """
 
-        if self.grab:
+        return self._ordered_planes.keys().index(name)
 
-            plane.rect.center = coordinates
+    def __getitem__(self, index):
+        """Return the name at index.
+        """
 
-            if plane.name not in self.subplanes_list:
+        return self._ordered_planes.keys()[index]
 
-                plane.parent.remove(plane.name)
+    def __contains__(self, name):
+        """Check for name in O(1).
+        """
 
-                self.sub(plane)
+        return name in self._ordered_planes
 
-        if self.dropped_upon_callback is not None:
-            self.dropped_upon_callback(self, plane, coordinates)
+    def __len__(self):
+        """Return the number of names.
+        """
 
-        return
+        return len(self._ordered_planes)
 
-    def destroy(self):
-        """Remove this Plane from the parent plane, remove all subplanes and delete all pygame Surfaces.
+    def __iter__(self):
+        """Iterate over the names, in order.
         """
 
-        if self.parent is not None:
+        return iter(self._ordered_planes.keys())
 
-            self.parent.remove(self.name)
+    def __reversed__(self):
+        """Iterate over the names, in reverse order.
+        """
 
-        self.remove_all()
+        return reversed(self._ordered_planes.keys())
 
-        self.image = self.rect = self.draggable =  self.grab = None
+    def __eq__(self, other):
+        """Compare to another sequence of names.
+        """
 
-        self.unsync()
+        return list(self) == list(other)
+
+    def __ne__(self, other):
+        """Compare to another sequence of names.
+        """
+
+        return not self == other
+
+    def __repr__(self):
+        """Readable string representation, like a list.
+        """
+
+        return repr(list(self))
+
+class SpatialIndex(object):
+    """A uniform grid over the rects of the subplanes of a Plane, for fast hit testing.
+
+       Attributes:
+
+       SpatialIndex.cell_size
+           Width and height of a grid cell in pixels.
+
+       SpatialIndex.cells
+           A dict mapping (column, row) tuples to sets of subplane names.
+
+       SpatialIndex.large_names
+           A set of names of subplanes that cover too many cells to be
+           entered into the grid. These are always tested.
+
+       SpatialIndex.entries
+           A dict mapping subplane names to tuples (rect, cell_list) as
+           entered into the index.
+
+       SpatialIndex.positions
+           A dict mapping subplane names to (layer, number) tuples that sort
+           in order of Plane.subplanes_list.
+    """
+
+    # Subplanes covering more cells are put into SpatialIndex.large_names
+    #
+    MAX_CELLS = 64
+
+    def __init__(self, plane):
+        """Initialise the index from the current subplanes of the Plane given.
+           The cell size is derived from the mean subplane size.
+        """
+
+        subplanes = plane.subplanes.values()
+
+        mean_size = 0
+
+        if subplanes:
+
+            mean_size = sum(subplane.rect.width + subplane.rect.height
+                            for subplane in subplanes) // (2 * len(subplanes))
+
+        self.cell_size = max(8, mean_size)
+
+        self.cells = {}
+
+        self.large_names = set()
+
+        self.entries = {}
+
+        self.positions = {}
+
+        self.next_position = 0
+
+        self.first_position = 0
+
+        for subplane in subplanes:
+
+            self.add(subplane.name, subplane.rect, subplane.layer)
 
         return
 
-    def sync(self, master_plane):
-        """Save the Plane given as master Plane and the position offset to that Plane for position synchronisation in Plane.update().
+    def add(self, name, rect, layer):
+        """Enter a subplane appended to its layer in Plane.subplanes_list into the index.
         """
 
-        self.sync_master_plane = master_plane
+        self.positions[name] = (layer, self.next_position)
 
-        # Using the offset between the centers of the Planes
-        #
-        self.offset = (self.rect.centerx - master_plane.rect.centerx,
-                       self.rect.centery - master_plane.rect.centery)
+        self.next_position += 1
+
+        self._enter(name, rect)
 
         return
 
-    def unsync(self):
-        """Remove the position synchronisation to the sync master Plane.
+    def reorder(self, name, layer, to_top = True):
+        """Update the position of a subplane that has been moved to the top or bottom of its layer.
         """
 
-        self.sync_master_plane = self.offset = None
+        if name in self.positions:
+
+            if to_top:
+
+                self.positions[name] = (layer, self.next_position)
+
+                self.next_position += 1
+
+            else:
+                self.first_position -= 1
+
+                self.positions[name] = (layer, self.first_position)
 
         return
 
-    def mouseover_callback(self):
-        """Callback function when the mouse cursor moves over this plane.
-           The default implementation sets Plane.mouseover to True when
-           Plane.highlight is set.
+    def _enter(self, name, rect):
+        """Enter name into the cells covered by rect.
         """
 
-        if self.highlight:
+        size = self.cell_size
 
-            self.mouseover = True
+        columns = range(rect.left // size, (rect.right - 1) // size + 1)
 
-            # Set to None to trigger a rendering
-            #
-            self.last_rect = None
+        rows = range(rect.top // size, (rect.bottom - 1) // size + 1)
+
+        if len(columns) * len(rows) > self.MAX_CELLS:
+
+            self.large_names.add(name)
+
+            cell_list = []
+
+        else:
+            cell_list = [(column, row) for column in columns for row in rows]
+
+            for cell in cell_list:
+
+                if cell in self.cells:
+
+                    self.cells[cell].add(name)
+
+                else:
+                    self.cells[cell] = set((name,))
+
+        self.entries[name] = (rect.copy(), cell_list)
 
         return
 
-    def mouseout_callback(self):
-        """Callback function when the mouse cursor has left this plane.
-           The default implementation sets Plan.mouseover to False.
+    def _leave(self, name):
+        """Remove name from all cells it has been entered into.
         """
 
-        # Not checking self.highlight here - it might have changed
+        rect, cell_list = self.entries.pop(name)
 
-        self.mouseover = False
+        if cell_list:
 
-        # Set to None to trigger a rendering
-        #
-        self.last_rect = None
+            for cell in cell_list:
+
+                names = self.cells[cell]
+
+                names.discard(name)
+
+                if not names:
+
+                    del self.cells[cell]
+
+        else:
+            self.large_names.discard(name)
 
         return
 
-    def random_name(self):
-        """Return a random string that is not in Plane.subplanes_list.
-           This is a convenience function to produce names for subplanes.
+    def discard(self, name):
+        """Remove a subplane from the index if it is present.
         """
 
-        name = None
+        if name in self.entries:
 
-        while name is None or name in self.subplanes_list:
+            self._leave(name)
 
-            name = "subplane{0}".format(str(random.randint(0, 99999)))
+            del self.positions[name]
 
-        return name
+        return
 
-    def __repr__(self):
-        """Readable string representation.
+    def move(self, name, rect):
+        """Update the index after the rect of a subplane has changed.
         """
 
-        parent_name = "None"
+        if name in self.entries and self.entries[name][0] != rect:
 
-        if self.parent is not None:
-            parent_name = self.parent.name
+            self._leave(name)
 
+            self._enter(name, rect)
 
-        repr_str = "<planes.Plane name='{0}' image={1} rect={2} parent='{3}' subplanes_list={4} draggable={5} grab={6} last_image_id={7} last_rect={8} left_click_callback={9} right_click_callback={10} dropped_upon_callback={11} sync_master_plane={12}>"
+        return
 
-        return repr_str.format(self.name,
-                               "{0}@{1}".format(self.image, id(self.image)),
-                               self.rect,
-                               parent_name,
-                               self.subplanes_list,
-                               self.draggable,
-                               self.grab,
-                               self.last_image_id,
-                               self.last_rect,
-                               self.left_click_callback,
-                               self.right_click_callback,
-                               self.dropped_upon_callback,
-                               self.sync_master_plane)
+    def sync(self, subplanes):
+        """Enter all subplanes again whose rect has been changed in place since they were entered.
+           subplanes is a sequence of all Planes in the index, as returned
+           by Plane.subplanes.values().
+        """
 
-class Display(Plane):
-    """planes main screen class.
-       A Display instance serves as the root Plane in planes.
+        entries = self.entries
 
-       Additional attributes:
+        for subplane in subplanes:
 
-       Display.display
-           The Pygame display Surface
+            rect = subplane.rect
 
-       Display.dragged_plane
-           The currently dragged plane
+            if entries[subplane.name][0] != rect:
 
-       Display.key_sensitive_plane
-           The Plane to be notified of Pygame keyboard events. Initially None.
+                self._leave(subplane.name)
 
-       Display.last_mouseover_plane
-           The last Plane a mouseover condition was found for. Initially None.
+                self._enter(subplane.name, rect)
 
-       Display.mouse_buttons
-           A dict mapping Pygame mouse button numbers to description strings.
+        return
 
-       Display.show_stats
-           Boolean flag to indicate whether to display performance statistics.
-           Set in Display.process() by examining user input. Initially False.
+    def get_names_at(self, coordinates):
+        """Return a list of names of the subplanes whose indexed rect contains coordinates, latest in Plane.subplanes_list first.
+        """
 
-       Display.font
-           A pygame.font.Font instance using the system default font.
+        cell = (coordinates[0] // self.cell_size,
+                coordinates[1] // self.cell_size)
+
+        names = [name for name in self.cells.get(cell, ()) if self.entries[name][0].collidepoint(coordinates)]
+
+        names.extend(name for name in self.large_names if self.entries[name][0].collidepoint(coordinates))
+
+        names.sort(key = self.positions.__getitem__, reverse = True)
+
+        return names
+
+def _extra_attribute(name):
+    """Return a property for a rarely used Plane attribute.
+       The value is kept in the Plane._extras dict, which is only created
+       when the first of these attributes is set to something other than
+       None. Unset attributes read as None.
     """
 
-    def __init__(self, resolution_tuple, fullscreen = False):
-        """Calling pygame.display.set_mode().
-           If fullscreen is True, the display will use the full screen.
+    def get_extra(plane):
+
+        if plane._extras is None:
+
+            return None
+
+        return plane._extras.get(name)
+
+    def set_extra(plane, value):
+
+        if value is None:
+
+            if plane._extras is not None:
+
+                plane._extras.pop(name, None)
+
+                if not plane._extras:
+
+                    plane._extras = None
+
+        elif plane._extras is None:
+
+            plane._extras = {name: value}
+
+        else:
+            plane._extras[name] = value
+
+        return
+
+    return property(get_extra, set_extra)
+
+# Blit a list of (source, dest[, area[, special_flags]]) tuples to a
+# Surface, in order. Pygame >= 1.9.4 can do that in a single call.
+#
+if hasattr(pygame.Surface, "blits"):
+
+    def _blit_sequence(surface, blit_list):
+        """Blit all tuples in blit_list to surface using Surface.blits().
         """
 
-        # Init Pygame, just to be on the safe side.
-        # pygame.init() can safely be called more than once.
-        #
-        pygame.init()
+        surface.blits(blit_list, False)
 
-        # TODO: Use flags = pygame.HWSURFACE | pygame.DOUBLEBUF ?
-        #
-        flags = 0
+        return
 
-        if fullscreen:
+else:
+    def _blit_sequence(surface, blit_list):
+        """Blit all tuples in blit_list to surface, one by one.
+        """
 
-            flags = flags | pygame.FULLSCREEN
+        for args in blit_list:
+
+            surface.blit(*args)
+
+        return
+
+# Pixel formats of the current display mode, see convert_surface().
+# A list [display_format, alpha_format], where each is a tuple
+# (bitsize, masks).
+#
+_DISPLAY_FORMATS = [None, None]
+
+# The Surface a HeadlessDisplay renders to, used as the conversion target
+# by convert_surface() when no display mode has been set.
+#
+_OFFSCREEN_SURFACE = None
+
+def convert_surface(surface):
+    """Return surface in the pixel format of the display, for fast blitting.
+
+       Surfaces with per-pixel alpha are converted using
+       Surface.convert_alpha(), all others using Surface.convert().
+       Colorkey and surface alpha are preserved.
+
+       If no display mode has been set, the Surface of a HeadlessDisplay
+       is used as the target format if there is one, and per-pixel alpha
+       Surfaces are expected in Pygame's default format.
+
+       Returns None if there is no display to convert to, or conversion
+       fails. If surface already has the display format, it is returned
+       as-is.
+    """
+
+    display_surface = pygame.display.get_surface()
+
+    if display_surface is None:
+
+        display_surface = _OFFSCREEN_SURFACE
+
+        if display_surface is None:
+
+            return None
+
+    display_format = (display_surface.get_bitsize(), display_surface.get_masks())
+
+    if _DISPLAY_FORMATS[0] != display_format:
+
+        _DISPLAY_FORMATS[0] = display_format
+
+        alpha_surface = pygame.Surface((1, 1), flags = pygame.SRCALPHA)
 
         try:
-            self.display = pygame.display.set_mode(resolution_tuple, flags)
+            alpha_surface = alpha_surface.convert_alpha()
 
         except pygame.error:
 
-            # Microsoft Windows SDL error: "No available video device"
-            # For a list see
-            # http://wiki.libsdl.org/FAQUsingSDL
+            # No display mode set
             #
-            import os
+            pass
 
-            os.environ['SDL_VIDEODRIVER'] = 'windib'
+        _DISPLAY_FORMATS[1] = (alpha_surface.get_bitsize(), alpha_surface.get_masks())
 
-            self.display = pygame.display.set_mode(resolution_tuple, flags)
+    flags = surface.get_flags()
 
-        Plane.__init__(self, "display", pygame.Rect((0, 0), resolution_tuple))
+    surface_format = (surface.get_bitsize(), surface.get_masks())
 
-        self.draggable = False
+    if flags & pygame.SRCALPHA:
 
-        # Keep track of the dragged plane
-        #
-        self.dragged_plane = None
+        if surface_format == _DISPLAY_FORMATS[1]:
 
-        self.key_sensitive_plane = None
+            return surface
 
-        self.last_mouseover_plane = None
+        try:
+            return surface.convert_alpha()
 
-        self.mouse_buttons = {1: "left",
-                              3: "right",
-                              4: "up",
-                              5: "down"}
+        except pygame.error:
 
-        self.show_stats = False
+            return None
 
-        self.font = pygame.font.SysFont("Bitstream Vera Sans,DejaVu Sans,Verdana",
-                                        14)
+    if surface_format == display_format:
 
-        # Convenience Surface for statistics display.
-        # See Display.render()
-        #
-        self._stats_surface = pygame.Surface((320, 600))
+        return surface
 
-        self._stats_surface.convert()
+    colorkey = surface.get_colorkey()
 
-        # Make transparent. Currently has only a limited effect, since it might
-        # be blitted over itself in render().
+    alpha = surface.get_alpha()
+
+    try:
+        converted = surface.convert(display_surface)
+
+    except pygame.error:
+
+        # pygame.display not initialised
         #
-        self._stats_surface.set_alpha(196, pygame.RLEACCEL)
+        return None
 
-        return
+    if colorkey is not None:
 
-    def key_sensitive(self, plane):
-        """Register the Plane given as sensitive to Pygame keyboard events.
-           Display will call plane.keydown(KEYDOWN_event) when a key is
-           pressed and the Plane has a parent.
-           plane.activate() will be called when the plane is registered.
-           plane.deactivate() will be called on the old plane.
-        """
+        converted.set_colorkey(colorkey, flags & pygame.RLEACCEL)
 
-        # TODO: there should be a class containing keydown(), activate(), deactivate()
+    if alpha is not None:
 
-        if self.key_sensitive_plane:
+        converted.set_alpha(alpha, flags & pygame.RLEACCEL)
 
-            self.key_sensitive_plane.deactivate()
+    return converted
+
+class SurfacePool(object):
+    """A SurfacePool keeps Surfaces that are no longer used, for reuse by widgets that redraw their image.
+
+       Surfaces are kept in buckets keyed by (size, flags, depth), as
+       given to SurfacePool.get(). Only Surfaces taken from the pool are
+       accepted back by SurfacePool.release(). New Surfaces are converted
+       to the display format using convert_surface(), so Plane.image can
+       use them without a copy, and counted in
+       STATS.surface_allocations.
+
+       Attributes:
+
+       SurfacePool.bucket_size
+           Maximum number of Surfaces kept per bucket. Surfaces released
+           to a full bucket are dropped.
+    """
+
+    def __init__(self, bucket_size = 4):
+        """Initialise an empty pool.
+        """
+
+        self.bucket_size = bucket_size
+
+        # {(<size>, <flags>, <depth>) : [<Surface>, ...]}
+        #
+        self._buckets = {}
+
+        # The bucket key of every Surface handed out and not yet dropped
+        #
+        self._keys = weakref.WeakKeyDictionary()
+
+        return
+
+    def get(self, size, flags = 0, depth = 0):
+        """Return a Surface of the size, flags and depth given, taken from the pool, or a new one.
+           The contents of the Surface are undefined, and colorkey and
+           surface alpha are unset.
+        """
+
+        key = (tuple(size), flags, depth)
+
+        bucket = self._buckets.get(key)
+
+        if bucket:
+
+            return bucket.pop()
+
+        if depth:
+
+            surface = pygame.Surface(key[0], flags, depth)
+
+        else:
+            surface = pygame.Surface(key[0], flags)
+
+        converted = convert_surface(surface)
+
+        if converted is not None:
+
+            surface = converted
+
+        STATS.surface_allocations += 1
+
+        self._keys[surface] = key
+
+        return surface
+
+    def reuse(self, surface, size, flags = 0, depth = 0):
+        """Return surface if it has been taken from the pool with the size, flags and depth given.
+           Otherwise, release surface and return SurfacePool.get(size,
+           flags, depth). surface may be None. Like SurfacePool.get(),
+           colorkey and surface alpha are unset.
+        """
+
+        if surface is not None:
+
+            key = (tuple(size), flags, depth)
+
+            if self._keys.get(surface) == key:
+
+                self._reset(surface, key)
+
+                return surface
+
+            self.release(surface)
+
+        return self.get(size, flags, depth)
+
+    def release(self, surface):
+        """Return surface to the pool. The caller must not use it afterwards.
+           Surfaces that have not been taken from the pool, and None, are
+           ignored.
+        """
+
+        if surface is None:
+
+            return
+
+        key = self._keys.get(surface)
+
+        if key is None:
+
+            return
+
+        bucket = self._buckets.setdefault(key, [])
+
+        if len(bucket) < self.bucket_size and surface not in bucket:
+
+            self._reset(surface, key)
+
+            bucket.append(surface)
+
+        return
+
+    def _reset(self, surface, key):
+        """Unset colorkey and surface alpha of surface, which has been taken from the pool with the key given.
+        """
+
+        # Passing no flags also drops RLE acceleration, which makes
+        # blitting to the Surface blend differently
+        #
+        surface.set_colorkey(None, 0)
+
+        if not key[1] & pygame.SRCALPHA:
+
+            surface.set_alpha(None, 0)
+
+        return
+
+    def clear(self):
+        """Drop all Surfaces kept in the pool.
+        """
+
+        self._buckets.clear()
+
+        return
+
+# The SurfacePool used by the widgets in planes.gui
+#
+SURFACE_POOL = SurfacePool()
+
+class Plane(object):
+    """A Plane is a surface in a hierarchy of surfaces.
+       Concept-wise it bears some similarities to pygame.sprite.Sprite.
+
+       Planes are currently not thread safe! Accessing a Plane from several
+       threads may produce unexpected results and errors.
+
+       Attributes:
+
+       Plane.name
+           Name of the plane.
+
+       Plane.image
+           The pygame.Surface for this Plane. When a Surface is assigned,
+           it is replaced by a copy in the pixel format of the display
+           if necessary, see convert_surface(). If no display mode has been
+           set yet, this happens when the Plane is first rendered.
+
+       Plane.rect
+           The render position of this Plane on the parent Plane.
+
+       Plane.parent
+           The parent plane. Initially None.
+
+       Plane.subplanes
+           An OrderedPlanes collection of subplanes, identified by their name.
+           Can be read like a dict. Use Plane.sub() and Plane.remove() to
+           change it.
+
+       Plane.subplanes_list
+           A read-only sequence of subplane names, in render order. This is
+           the order of their addition within each layer.
+
+       Plane.layer
+           The z-order layer of this Plane among its siblings. Planes in
+           higher layers are drawn on top of, and hit before, Planes in
+           lower layers. Setting it is the same as calling
+           Plane.set_layer(). Initially 0.
+
+       Plane.draggable
+           Boolean flag. If True, this Plane can be dragged and dropped.
+
+       Plane.grab
+           Boolean flag. If True, this Plane will remove dropped Planes from
+           their parent Plane and make it a subplane of this one.
+           Handled in Plane.dropped_upon()
+
+       Plane.highlight
+           Boolean flag. If True, the Plane be highlighted when the mouse cursor
+           moves over it.
+
+       Plane.last_image_id
+           Caches object id of the image at last rendering for efficiency.
+
+       Plane.last_rect
+           Caches rect at last rendering for efficiency. Set to None to force
+           a redraw, for example after drawing to Plane.image in place.
+
+       Plane.left_click_callback
+           Callback function when this plane has been clicked with the left
+           mouse button.
+
+       Plane.right_click_callback
+           Callback function when this plane has been clicked with the right
+           mouse button.
+
+       Plane.up_click_callback
+           Callback function when the mouse wheel has been moved up above this
+           Plane.
+
+       Plane.down_click_callback
+           Callback function when the mouse wheel has been moved down above this
+           Plane.
+
+       Plane.dropped_upon_callback
+           Callback function when a plane has been dropped upon this plane.
+
+       Plane.mouseover_callback
+           Callback function when the mouse cursor moves over this plane.
+
+       Plane.mouseout_callback
+           Callback function when the mouse cursor has left this plane.
+
+       Plane.mouseover
+           Flag indicating whether the mouse cursor is over this Plane.
+           Initially False.
+
+       Plane.cache_rendering
+           Boolean flag. If True, the composite of this Plane's image and all
+           of its subplanes is kept in Plane.rendersurface and blitted in one
+           go, until something in this subtree changes. Subplanes are
+           clipped to the bounds of this Plane then. Initially False.
+
+       Plane.rendersurface
+           The cached composite of this Plane and its subplanes if
+           Plane.cache_rendering is True, else None. Reset to None by
+           Plane.invalidate().
+
+       Plane.sync_master_plane
+          A Plane that this Plane's position will sync to. Initally None.
+
+       Plane.offset
+          A tuple (x, y) describing the offset to the sync master plane.
+          Initially None.
+
+       Plane.scroll_offset
+           A tuple (x, y) by which all subplanes are shifted when rendering,
+           without touching their rects, e.g. to scroll content. Hit
+           testing in Plane.get_plane_at() and drop coordinates take it
+           into account. Initially (0, 0).
+
+       A Plane can be put to sleep using Plane.sleep(). Plane.update() then
+       skips it along with its subplanes until it is woken up, see
+       Plane.wake().
+
+       To keep large hierarchies small in memory, Plane uses __slots__ for
+       frequently used attributes. The callbacks, Plane.sync_master_plane,
+       Plane.offset and Plane.scroll_offset are kept in a dict that is only
+       created once one of them is set. Other attributes can still be added
+       to a Plane as usual.
+    """
+
+    __slots__ = ("name",
+                 "_image",
+                 "_image_converted",
+                 "rect",
+                 "draggable",
+                 "grab",
+                 "highlight",
+                 "mouseover",
+                 "parent",
+                 "subplanes",
+                 "_layer",
+                 "last_image_id",
+                 "last_rect",
+                 "cache_rendering",
+                 "rendersurface",
+                 "_screen_rect",
+                 "_removed_rects",
+                 "_spatial_index",
+                 "_highlight_cache",
+                 "_drawn_mouseover",
+                 "_extras",
+                 "_sleeping",
+                 "__dict__",
+                 "__weakref__")
+
+    left_click_callback = _extra_attribute("left_click_callback")
+    right_click_callback = _extra_attribute("right_click_callback")
+    up_click_callback = _extra_attribute("up_click_callback")
+    down_click_callback = _extra_attribute("down_click_callback")
+    dropped_upon_callback = _extra_attribute("dropped_upon_callback")
+    sync_master_plane = _extra_attribute("sync_master_plane")
+    offset = _extra_attribute("offset")
+    _scroll_offset = _extra_attribute("scroll_offset")
+
+    def get_image(self):
+        """Return Plane.image.
+        """
+
+        return self._image
+
+    def set_image(self, surface):
+        """Set Plane.image, converting surface to the display format if a display mode has been set.
+        """
+
+        self._image = surface
+
+        self._image_converted = False
+
+        if surface is not None:
+
+            self.convert_image()
+
+        return
+
+    image = property(get_image, set_image)
+
+    def convert_image(self):
+        """Convert Plane.image to the display format, if a display mode has been set.
+           Returns True if Plane.image now has the display format, False
+           otherwise.
+        """
+
+        converted = convert_surface(self._image)
+
+        if converted is None:
+
+            return False
+
+        self._image = converted
+
+        self._image_converted = True
+
+        return True
+
+    # TODO: it should be possible to initialise a Plane with a Pygame Surface, for convenvience.
+    #
+    def __init__(self,
+                 name,
+                 rect,
+                 draggable = False,
+                 grab = False,
+                 highlight = False,
+                 left_click_callback = None,
+                 right_click_callback = None,
+                 up_click_callback = None,
+                 down_click_callback = None,
+                 dropped_upon_callback = None):
+        """Initialize the Plane.
+           name is the name of the plane which can also be used
+           as an attribute.
+           rect is an instance of pygame.Rect giving width, height
+           and render position.
+           draggable is a flag indicating whether this plane can be dragged.
+           grab is a flag indicating whether other planes can be dropped
+           on this one.
+           clicked_callback and dropped_upon_callback, if given, must be
+           functions.
+           Planes are filled with solid black color by default.
+        """
+
+        self.name = name
+
+        # We do not use the SRCALPHA flag because it considerably slows down the
+        # rendering. If an application needs per-pixel alpha, it can always
+        # substitute Plane.image with an RGBA Surface.
+        #
+        self.image = pygame.Surface(rect.size, flags = pygame.HWSURFACE)
+
+        # Transparent by default, so let's paint it black
+        #
+        self.image.fill((0, 0, 0, 255))
+
+        # Rect is relative to the parent plane, not to the display!
+        #
+        self.rect = rect
+
+        self.draggable = draggable
+        self.grab = grab
+
+        self.highlight = highlight
+        self.mouseover = False
+
+        # Parent stores the parent plane.
+        # Upon creation, there is none.
+        #
+        self.parent = None
+
+        self.subplanes = NO_SUBPLANES
+
+        self._layer = 0
+
+        # Caches for efficient rendering
+        #
+        self.last_image_id = None
+
+        # Initialize to None to trigger a rendering
+        #
+        self.last_rect = None
+
+        # Display coordinates the Plane has been drawn to, and a list of
+        # display areas freed by removed subplanes. Both are maintained by
+        # Display.render() when dirty rendering is enabled.
+        #
+        self._screen_rect = None
+        self._removed_rects = None
+
+        # Built on demand in get_plane_at()
+        #
+        self._spatial_index = None
+
+        # Retained composite rendering
+        #
+        self.cache_rendering = False
+        self.rendersurface = None
+
+        # A tuple (image, overlay) caching the highlight overlay for the
+        # image, and the mouseover state at last rendering
+        #
+        self._highlight_cache = None
+        self._drawn_mouseover = False
+
+        # None while awake, else True or the time to wake up at.
+        # See Plane.sleep().
+        #
+        self._sleeping = None
+
+        # Save callbacks
+        #
+        self._extras = None
+
+        self.left_click_callback = left_click_callback
+        self.right_click_callback = right_click_callback
+        self.up_click_callback = up_click_callback
+        self.down_click_callback = down_click_callback
+        self.dropped_upon_callback = dropped_upon_callback
+
+        return
+
+    def sub(self, plane, insert_after = None, insert_before = None):
+        """Remove the Plane given from its current parent and add it as a subplane of this Plane.
+
+           If insert_after is given, the new subplane will be inserted
+           immediately after the subplane with that name in Plane.subplanes_list.
+
+           If insert_before is given, it will be inserter immediately
+           before the subplane with the name given.
+
+           In both cases, the new subplane joins the layer of that
+           subplane. Else it will simply be appended to its Plane.layer.
+
+           If a subplane with the same name already exists, it is silently
+           replaced by the new plane.
+        """
+
+        global GEOMETRY_VERSION
+
+        if plane.parent is not None:
+
+            plane.parent.remove(plane.name)
+
+        if self.subplanes is NO_SUBPLANES:
+
+            self.subplanes = OrderedPlanes()
+
+        elif plane.name in self.subplanes:
+
+            # The replaced Plane will no longer be drawn
+            #
+            replaced_plane = self.subplanes.remove(plane.name)
+
+            self._damage_subtree(replaced_plane)
+
+            replaced_plane.parent = None
+
+            if self._spatial_index is not None:
+
+                self._spatial_index.discard(plane.name)
+
+        if insert_after is not None and insert_after in self.subplanes:
+
+            self.subplanes.insert_after(insert_after, plane)
+
+            # Order changed, rebuild on demand
+            #
+            self._spatial_index = None
+
+        elif insert_before is not None and insert_before in self.subplanes:
+
+            self.subplanes.insert_before(insert_before, plane)
+
+            self._spatial_index = None
+
+        else:
+            self.subplanes.append(plane)
+
+            if self._spatial_index is not None:
+
+                self._spatial_index.add(plane.name, plane.rect, plane._layer)
+
+        plane.parent = self
+
+        # Reset to None to trigger a rendering
+        #
+        plane.last_rect = None
+
+        self.invalidate()
+
+        GEOMETRY_VERSION += 1
+
+        return
+
+    def remove(self, plane_identifier):
+        """Remove subplane by name or Plane instance.
+        """
+
+        global GEOMETRY_VERSION
+
+        # Accept Plane name as well as Plane instance
+        #
+        if isinstance(plane_identifier, Plane):
+
+            name = plane_identifier.name
+
+        else:
+            name = plane_identifier
+
+        if name in self.subplanes:
+
+            plane = self.subplanes.remove(name)
+
+            # The area freed will be redrawn
+            #
+            self._damage_subtree(plane)
+
+            plane.parent = None
+
+            STATS.forget_plane(plane)
+
+            if self._spatial_index is not None:
+
+                self._spatial_index.discard(name)
+
+            self.invalidate()
+
+            GEOMETRY_VERSION += 1
+
+        return
+
+    def get_layer(self):
+        """Return Plane.layer.
+        """
+
+        return self._layer
+
+    def set_layer(self, layer):
+        """Move this Plane to the top of the layer given among its siblings.
+        """
+
+        if self.parent is None:
+
+            self._layer = layer
+
+        else:
+            subplanes = self.parent.subplanes
+
+            subplanes.remove(self.name)
+
+            self._layer = layer
+
+            subplanes.append(self)
+
+            self.parent._reordered(self, True)
+
+        return
+
+    layer = property(get_layer, set_layer)
+
+    def get_scroll_offset(self):
+        """Return Plane.scroll_offset.
+        """
+
+        scroll_offset = self._scroll_offset
+
+        if scroll_offset is None:
+
+            return (0, 0)
+
+        return scroll_offset
+
+    def set_scroll_offset(self, scroll_offset):
+        """Shift all subplanes by scroll_offset, a tuple (x, y), when rendering.
+           The rects of the subplanes are not changed.
+        """
+
+        x, y = scroll_offset
+
+        if x or y:
+
+            self._scroll_offset = (x, y)
+
+        else:
+            self._scroll_offset = None
+
+        # The cached composite shows the subplanes at the old offset. The
+        # display areas are damaged in collect_damage(), as the display
+        # positions of the subplanes change.
+        #
+        self.invalidate()
+
+        return
+
+    scroll_offset = property(get_scroll_offset, set_scroll_offset)
+
+    def raise_to_top(self):
+        """Move this Plane to the top of its layer, so it is drawn above all of its siblings in that layer.
+        """
+
+        if self.parent is not None:
+
+            subplanes = self.parent.subplanes
+
+            subplanes.remove(self.name)
+
+            subplanes.append(self)
+
+            self.parent._reordered(self, True)
+
+        return
+
+    def lower_to_bottom(self):
+        """Move this Plane to the bottom of its layer, so it is drawn below all of its siblings in that layer.
+        """
+
+        if self.parent is not None:
+
+            subplanes = self.parent.subplanes
+
+            subplanes.remove(self.name)
+
+            subplanes.prepend(self)
+
+            self.parent._reordered(self, False)
+
+        return
+
+    def _reordered(self, plane, to_top):
+        """Update caches after subplane plane has been moved to the top or bottom of its layer.
+        """
+
+        global GEOMETRY_VERSION
+
+        if self._spatial_index is not None:
+
+            self._spatial_index.reorder(plane.name, plane._layer, to_top)
+
+        # Overlapping siblings must be redrawn
+        #
+        if plane._screen_rect is not None:
+
+            if self._removed_rects is None:
+
+                self._removed_rects = [plane._screen_rect]
+
+            else:
+                self._removed_rects.append(plane._screen_rect)
+
+        self.invalidate()
+
+        GEOMETRY_VERSION += 1
+
+        return
+
+    def _damage_subtree(self, plane):
+        """Register the display areas that plane and its subplanes have been drawn to as damaged.
+           They will be redrawn by the next call to Display.render() in dirty
+           rendering mode.
+        """
+
+        damaged_rects = []
+
+        pending_planes = [plane]
+
+        while pending_planes:
+
+            pending_plane = pending_planes.pop()
+
+            if pending_plane._screen_rect is not None:
+
+                damaged_rects.append(pending_plane._screen_rect)
+
+                pending_plane._screen_rect = None
+
+            if pending_plane._removed_rects:
+
+                damaged_rects.extend(pending_plane._removed_rects)
+
+                pending_plane._removed_rects = None
+
+            pending_planes.extend(pending_plane.subplanes.values())
+
+        if damaged_rects:
+
+            if self._removed_rects is None:
+
+                self._removed_rects = damaged_rects
+
+            else:
+                self._removed_rects.extend(damaged_rects)
+
+        return
+
+    def invalidate(self):
+        """Discard the cached composite rendering of this Plane and all of its parents.
+           They will be recomposed when they are rendered next.
+        """
+
+        plane = self
+
+        while plane is not None:
+
+            plane.rendersurface = None
+
+            plane = plane.parent
+
+        return
+
+    def compose(self):
+        """Render this Plane, highlighted if Plane.mouseover is set, and all subplanes to Plane.rendersurface.
+        """
+
+        if not self._image_converted:
+
+            self.convert_image()
+
+        self.rendersurface = self._image.copy()
+
+        if self.mouseover:
+
+            self.rendersurface.blit(self.highlight_overlay(),
+                                    (0, 0),
+                                    special_flags = pygame.BLEND_ADD)
+
+        self.render(self.rendersurface, pygame.Rect((0, 0), self.rect.size))
+
+        return
+
+    def remove_all(self):
+        """Convenience method to call Plane.remove() for all subplanes.
+        """
+
+        # This is a copy which will not be changed by remove()
+        #
+        for name in self.subplanes.keys():
+
+            self.remove(name)
+
+        return
+
+    @property
+    def subplanes_list(self):
+        """A read-only sequence of subplane names, in order of their addition.
+        """
+
+        return PlaneNames(self.subplanes)
+
+    def __getattr__(self, name):
+        """Access subplanes as attributes.
+        """
+
+        # The Python interpreter has already checked instance and class
+        # attributes. If this fails, an appropriate KeyError will be raised.
+        #
+        return self.subplanes[name]
+
+    def render(self, rendersurface, offset_rect):
+        """Draw a composite surface of this plane and all subplanes, in order of their addition.
+
+           rendersurface is a Pygame Surface to render to.
+
+           offset_rect is a Pygame Rect giving the offset and the
+           clipping area. Subplanes are clipped to the bounds of their
+           parent Plane, and shifted by Plane.scroll_offset.
+
+           Subplanes that do not intersect with the clipping area are
+           skipped along with all of their subplanes.
+
+           This method will highlight subplanes that have the
+           Plane.mousover flag set.
+
+           Subplane images are drawn using batched blits. Subplanes
+           without subplanes of their own are not recursed into.
+
+           This implementation does not collect any statistics. While
+           STATS.enabled is True, it is replaced by an instrumented one,
+           see Stats.enable(). Both draw using Plane._render_subplanes().
+        """
+
+        self._render_subplanes(rendersurface, offset_rect, None)
+
+        return
+
+    def _render_instrumented(self, rendersurface, offset_rect):
+        """Like Plane.render(), and log per-Plane statistics in STATS.
+
+           Installed as Plane.render() while STATS.enabled is True, see
+           Stats.enable(). Subplanes skipped because they do not intersect
+           with the clipping area are counted in STATS.culled_planes.
+           Render times are taken with PROFILING_TIMER_FUNC, and logged
+           using STATS.log_plane_time(). Leaves do not show up in
+           STATS.plane_times.
+        """
+
+        timestamp = PROFILING_TIMER_FUNC()
+
+        STATS.total_pixels += self.rect.width * self.rect.height
+
+        # Do not take render times of subplanes into account
+        #
+        subplane_time = self._render_subplanes(rendersurface, offset_rect, STATS)
+
+        STATS.log_plane_time(self, (PROFILING_TIMER_FUNC() - timestamp - subplane_time) / 1000000.0)
+
+        return
+
+    def _render_subplanes(self, rendersurface, offset_rect, stats):
+        """Draw all subplanes for Plane.render() and its instrumented version.
+
+           If stats is a Stats instance, culled planes, unconverted blits,
+           composite cache hits and pixels of leaves are counted in it,
+           and the time spent in rendering and composing subplanes is
+           returned, as measured by PROFILING_TIMER_FUNC. If stats is None,
+           nothing is counted and 0 is returned.
+        """
+
+        subplane_time = 0
+
+        # Blit subplanes in order. Obey mouseover flag.
+        # Redraw everything within the clipping area.
+
+        # Make blits look like they only affect the current surface.
+        # Respect a clipping area that has been set by the caller, e.g. by
+        # Display.render() when only redrawing damaged areas.
+        #
+        previous_clip = rendersurface.get_clip()
+
+        clip = offset_rect.clip(previous_clip)
+
+        rendersurface.set_clip(clip)
+
+        offset = offset_rect.topleft
+
+        # Subplanes are drawn shifted by Plane.scroll_offset
+        #
+        if self._extras is not None and self._scroll_offset is not None:
+
+            offset = (offset[0] + self._scroll_offset[0],
+                      offset[1] + self._scroll_offset[1])
+
+        # Consecutive blits are collected and submitted in one go. The
+        # list is flushed before recursing into a subplane with subplanes
+        # of its own, to keep the drawing order.
+        #
+        blit_list = []
+
+        for subplane in self.subplanes.values():
+
+            # Display position of the subplane, which also is the clipping
+            # area for its subplanes
+            #
+            subplane_rect = subplane.rect.move(offset)
+
+            if not clip.colliderect(subplane_rect):
+
+                if stats is not None:
+
+                    stats.culled_planes += 1
+
+                continue
+
+            if subplane.cache_rendering:
+
+                # Blit the composite of the whole subtree, and do not recurse
+                #
+                if _CHECK_COMPOSITES:
+
+                    subplane.check_composite()
+
+                if subplane.rendersurface is None:
+
+                    if stats is None:
+
+                        subplane.compose()
+
+                    else:
+                        stats.composite_cache_misses += 1
+
+                        subplane_timestamp = PROFILING_TIMER_FUNC()
+
+                        subplane.compose()
+
+                        subplane_time += PROFILING_TIMER_FUNC() - subplane_timestamp
+
+                elif stats is not None:
+
+                    stats.composite_cache_hits += 1
+
+                blit_list.append((subplane.rendersurface, subplane_rect))
+
+                continue
+
+            # Images that have been assigned before a display mode was set
+            # are converted here.
+            #
+            if not subplane._image_converted and not subplane.convert_image() and stats is not None:
+
+                stats.unconverted_blits += 1
+
+            # First blit the image, so it forms the background
+            # for further blits of subplane-subplanes
+            #
+            blit_list.append((subplane._image, subplane_rect))
+
+            # Add a highlight on top if mouseover is set
+            #
+            if subplane.mouseover:
+
+                blit_list.append((subplane.highlight_overlay(),
+                                  subplane_rect,
+                                  None,
+                                  pygame.BLEND_ADD))
+
+            # Leaves are done, unless a subclass draws something in render()
+            #
+            if not subplane.subplanes and type(subplane).render is Plane.render:
+
+                if stats is not None:
+
+                    stats.total_pixels += subplane_rect.width * subplane_rect.height
+
+                continue
+
+            _blit_sequence(rendersurface, blit_list)
+
+            blit_list = []
+
+            # Now recurse depth-first into subplanes of this
+            # subplane
+            #
+            if stats is None:
+
+                subplane.render(rendersurface, subplane_rect)
+
+            else:
+                subplane_timestamp = PROFILING_TIMER_FUNC()
+
+                subplane.render(rendersurface, subplane_rect)
+
+                subplane_time += PROFILING_TIMER_FUNC() - subplane_timestamp
+
+        if blit_list:
+
+            _blit_sequence(rendersurface, blit_list)
+
+        # Clean up for future draw operations
+        #
+        rendersurface.set_clip(previous_clip)
+
+        return subplane_time
+
+    def highlight_overlay(self):
+        """Return a Surface to be blitted over Plane.image using BLEND_ADD to highlight this Plane.
+
+           The overlay is computed once per image and cached. The cache is
+           cleared when Plane.image is replaced or redrawn, see
+           Plane.collect_damage().
+        """
+
+        if (self._highlight_cache is not None
+            and self._highlight_cache[0] is self.image):
+
+            return self._highlight_cache[1]
+
+        overlay = self.image.copy()
+
+        # Only premultiply Surfaces with the SRCALPHA flag,
+        # will raise an exception otherwise.
+        #
+        if overlay.get_flags() & 0x00010000:
+
+            # Premultiply alpha channel to RGB.
+            # Otherwise invisible RGB values will be
+            # added by BLEND_ADD. Technique suggested
+            # by Rene Dudfield <renesd@gmail.com> on
+            # pygame-users@seul.org on 19 Dec 2011
+            #
+            overlay = pygame.image.fromstring(pygame.image.tostring(overlay,
+                                                                    "RGBA_PREMULT"),
+                                              overlay.get_size(),
+                                              "RGBA")
+
+        overlay.blit(overlay, (0, 0), special_flags = pygame.BLEND_MULT)
+        overlay.blit(overlay, (0, 0), special_flags = pygame.BLEND_MULT)
+
+        self._highlight_cache = (self.image, overlay)
+
+        return overlay
+
+    def collect_damage(self, offset, damaged_rects):
+        """Append the display areas of all subplanes which changed since the last call to damaged_rects.
+
+           offset is a tuple (x, y) giving the display position of this
+           Plane. Subplanes are taken to be shifted by Plane.scroll_offset.
+
+           A subplane counts as changed if its position, size, image or
+           Plane.mouseover flag have changed, or if Plane.last_rect has been
+           reset to None. Both the area it has previously been drawn to and
+           the new area are appended. Areas freed by removed subplanes are
+           appended as well.
+
+           Cached composite renderings affected by a change are
+           invalidated.
+
+           This method updates Plane.last_rect and Plane.last_image_id.
+           It is called by Display.render() once per frame with dirty
+           rendering. Subplanes without subplanes of their own are not
+           recursed into.
+        """
+
+        global GEOMETRY_VERSION
+
+        if self._removed_rects:
+
+            damaged_rects.extend(self._removed_rects)
+
+            self._removed_rects = None
+
+        if self._extras is not None and self._scroll_offset is not None:
+
+            offset = (offset[0] + self._scroll_offset[0],
+                      offset[1] + self._scroll_offset[1])
+
+        for subplane in self.subplanes.values():
+
+            screen_rect = subplane.rect.move(offset)
+
+            if (subplane.last_rect != subplane.rect
+                or subplane.last_image_id != id(subplane._image)
+                or subplane.mouseover != subplane._drawn_mouseover
+                or subplane._screen_rect != screen_rect):
+
+                if subplane._screen_rect is not None:
+
+                    damaged_rects.append(subplane._screen_rect)
+
+                damaged_rects.append(screen_rect)
+
+                if subplane._screen_rect != screen_rect:
+
+                    GEOMETRY_VERSION += 1
+
+                if (subplane.last_rect is None
+                    or subplane.last_rect.size != subplane.rect.size
+                    or subplane.last_image_id != id(subplane._image)):
+
+                    # The subplane itself looks different
+                    #
+                    subplane._highlight_cache = None
+
+                    subplane.invalidate()
+
+                elif subplane.mouseover != subplane._drawn_mouseover:
+
+                    # Highlight toggled
+                    #
+                    subplane.invalidate()
+
+                elif subplane.last_rect != subplane.rect:
+
+                    # The subplane moved on this Plane
+                    #
+                    self.invalidate()
+
+                if self._spatial_index is not None:
+
+                    self._spatial_index.move(subplane.name, subplane.rect)
+
+                subplane.last_rect = subplane.rect.copy()
+                subplane.last_image_id = id(subplane._image)
+                subplane._drawn_mouseover = subplane.mouseover
+                subplane._screen_rect = screen_rect
+
+            # Leaves have nothing to report below themselves
+            #
+            if subplane.subplanes or subplane._removed_rects:
+
+                subplane.collect_damage(screen_rect.topleft, damaged_rects)
+
+        return
+
+    def check_composite(self):
+        """Discard Plane.rendersurface if this Plane or any of its subplanes have changed since the last check.
+           Called when rendering a Plane with Plane.cache_rendering set
+           while Display.render() does not collect damage, i.e. without
+           dirty rendering. With dirty rendering,
+           Plane.collect_damage() does this for all Planes.
+        """
+
+        if (self.last_rect is None
+            or self.last_rect.size != self.rect.size
+            or self.last_image_id != id(self._image)):
+
+            self._highlight_cache = None
+
+            self.invalidate()
+
+        elif self.mouseover != self._drawn_mouseover:
+
+            self.invalidate()
+
+        self.last_rect = self.rect.copy()
+        self.last_image_id = id(self._image)
+        self._drawn_mouseover = self.mouseover
+
+        # Screen positions only matter with dirty rendering, which starts
+        # with a full redraw
+        #
+        self.collect_damage((0, 0), [])
+
+        return
+
+    def get_plane_at(self, coordinates):
+        """Return the (sub)plane and the succeeding parent coordinates at the given coordinates.
+           Subplanes are tested in reverse order of their addition (i.e. latest first).
+
+           Planes with at least SPATIAL_INDEX_THRESHOLD subplanes look up
+           candidates in a SpatialIndex. Subplane rects that have been
+           changed in place are entered into the index again before each
+           lookup, so the result does not depend on the number of
+           subplanes.
+
+           Coordinates are shifted back by Plane.scroll_offset before
+           testing subplanes, so the coordinates returned are relative to
+           the subplane space of the Plane found, as used for dropping.
+        """
+
+        if self._extras is not None and self._scroll_offset is not None:
+
+            coordinates = (coordinates[0] - self._scroll_offset[0],
+                           coordinates[1] - self._scroll_offset[1])
+
+        if self._spatial_index is not None:
+
+            if len(self.subplanes) < SPATIAL_INDEX_THRESHOLD // 2:
+
+                self._spatial_index = None
+
+        elif len(self.subplanes) >= SPATIAL_INDEX_THRESHOLD:
+
+            self._spatial_index = SpatialIndex(self)
+
+        if self._spatial_index is not None:
+
+            self._spatial_index.sync(self.subplanes.values())
+
+            candidates = [self.subplanes[name] for name in self._spatial_index.get_names_at(coordinates)]
+
+        else:
+            candidates = reversed(self.subplanes.values())
+
+        for plane in candidates:
+
+            if plane.rect.collidepoint(coordinates):
+
+                return plane.get_plane_at((coordinates[0] - plane.rect.left,
+                                           coordinates[1] - plane.rect.top))
+
+        # It's probaly me.
+        #
+        return (self, coordinates)
+
+    def update(self):
+        """Update hook. The default implementation calls update() on all subplanes.
+
+           If Plane.sync_master_plane is not None, the position of this
+           Plane will be synced to that of the master Plane, using
+           Plane.offset.
+
+           Sleeping subplanes are skipped, see Plane.sleep(). So are
+           subplanes that have nothing to update: Planes without
+           subplanes and sync master plane whose class does not override
+           update(). An update function assigned to a single Plane
+           instance is not called for such Planes. Override update() in a
+           subclass instead.
+
+           This implementation does not collect any statistics. While
+           STATS.enabled is True, it is replaced by an instrumented one,
+           see Stats.enable().
+
+           Compare pygame.sprite.Sprite.update.
+        """
+
+        # Subplanes may be destroyed in update(). Plane.subplanes.values() is
+        # a tuple that will not change during iteration.
+        #
+        for plane in self.subplanes.values():
+
+            if plane._sleeping is not None and not plane._wake_if_due():
+
+                continue
+
+            if (not plane.subplanes
+                and type(plane).update is Plane.update
+                and (plane._extras is None or plane.sync_master_plane is None)):
+
+                continue
+
+            plane.update()
+
+        if self._extras is not None and self.sync_master_plane is not None:
+
+            self.rect.center = (self.sync_master_plane.rect.centerx + self.offset[0],
+                                self.sync_master_plane.rect.centery + self.offset[1])
+
+        return
+
+    def _update_instrumented(self):
+        """Like Plane.update(), and count the call in STATS.updated_planes.
+           Installed as Plane.update() while STATS.enabled is True, see
+           Stats.enable().
+        """
+
+        STATS.updated_planes += 1
+
+        Plane._update_lean(self)
+
+        return
+
+    def sleep(self, seconds = None):
+        """Exclude this Plane and all of its subplanes from Plane.update() until woken up.
+
+           The Plane is woken up by Plane.wake(), which Display.process()
+           calls for Planes receiving an event, after the number of
+           seconds given if it is not None, and when the position of its
+           sync master plane changes.
+
+           Rendering is not affected.
+        """
+
+        if seconds is None:
+
+            self._sleeping = True
+
+        else:
+            self._sleeping = TIMER_FUNC() + seconds
+
+        return
+
+    def wake(self):
+        """Wake up this Plane and all Planes above it in the hierarchy, so they are updated again.
+        """
+
+        plane = self
+
+        while plane is not None:
+
+            plane._sleeping = None
+
+            plane = plane.parent
+
+        return
+
+    def _wake_if_due(self):
+        """Wake up this sleeping Plane if its time is up or its sync master plane has moved.
+           Returns True if the Plane has been woken up.
+        """
+
+        if self._sleeping is not True and TIMER_FUNC() >= self._sleeping:
+
+            self._sleeping = None
+
+        elif (self._extras is not None
+              and self.sync_master_plane is not None
+              and self.rect.center != (self.sync_master_plane.rect.centerx + self.offset[0],
+                                       self.sync_master_plane.rect.centery + self.offset[1])):
+
+            self._sleeping = None
+
+        return self._sleeping is None
+
+    def del_image(self):
+        """Convenience method, replacing this Plane's image with a transparent 1px x 1px Pygame Surface.
+
+           Plane.rect is left as-is.
+        
+           Useful for container surfaces which have no background.
+        """
+
+        self.image = pygame.Surface((1, 1))
+
+        self.image.set_alpha(0, pygame.RLEACCEL)
+        
+        return
+        
+    def clicked(self, button_name):
+        """Called when there is a MOUSEDOWN event on this plane.
+           If click callbacks are set, the appropriate one is called with this
+           Plane as argument.
+        """
+
+        if button_name == "left" and self.left_click_callback is not None:
+
+            self.left_click_callback(self)
+
+        elif button_name == "right" and self.right_click_callback is not None:
+
+            self.right_click_callback(self)
+
+        elif button_name == "up" and self.up_click_callback is not None:
+
+            self.up_click_callback(self)
+
+        elif button_name == "down" and self.down_click_callback is not None:
+
+            self.down_click_callback(self)
+
+        return
+
+    def dropped_upon(self, plane, coordinates):
+        """If a plane is dropped on top of this one, call dropped_upon_callback() and conditionally grab it.
+
+           If Plane.grab is True, the default implementation will remove the
+           dropped Plane from its parent and make it a subplane of this one.
+
+           If the dropped Plane is already a subplane of this one, its position
+           is updated.
+
+           If Plane.dropped_upon_callback is set, it is called with
+           Plane.dropped_upon_callback(self, plane, coordinates)
+        """
+
+        if self.grab:
+
+            plane.rect.center = coordinates
+
+            if plane.name not in self.subplanes:
+
+                plane.parent.remove(plane.name)
+
+                self.sub(plane)
+
+        if self.dropped_upon_callback is not None:
+            self.dropped_upon_callback(self, plane, coordinates)
+
+        return
+
+    def destroy(self):
+        """Remove this Plane from the parent plane, remove all subplanes and delete all pygame Surfaces.
+           Plane.image is returned to SURFACE_POOL if it has been taken
+           from there.
+        """
+
+        if self.parent is not None:
+
+            self.parent.remove(self.name)
+
+        self.remove_all()
+
+        # Images of widgets may come from the pool
+        #
+        SURFACE_POOL.release(self.image)
+
+        STATS.forget_plane(self)
+
+        self.image = self.rect = self.draggable =  self.grab = None
+
+        self.rendersurface = self._highlight_cache = None
+
+        self.unsync()
+
+        return
+
+    def sync(self, master_plane):
+        """Save the Plane given as master Plane and the position offset to that Plane for position synchronisation in Plane.update().
+        """
+
+        self.sync_master_plane = master_plane
+
+        # Using the offset between the centers of the Planes
+        #
+        self.offset = (self.rect.centerx - master_plane.rect.centerx,
+                       self.rect.centery - master_plane.rect.centery)
+
+        return
+
+    def unsync(self):
+        """Remove the position synchronisation to the sync master Plane.
+        """
+
+        self.sync_master_plane = self.offset = None
+
+        return
+
+    def mouseover_callback(self):
+        """Callback function when the mouse cursor moves over this plane.
+           The default implementation sets Plane.mouseover to True when
+           Plane.highlight is set.
+        """
+
+        if self.highlight:
+
+            self.mouseover = True
+
+        return
+
+    def mouseout_callback(self):
+        """Callback function when the mouse cursor has left this plane.
+           The default implementation sets Plan.mouseover to False.
+        """
+
+        # Not checking self.highlight here - it might have changed
+
+        self.mouseover = False
+
+        return
+
+    def random_name(self):
+        """Return a random string that is not in Plane.subplanes.
+           This is a convenience function to produce names for subplanes.
+        """
+
+        name = None
+
+        while name is None or name in self.subplanes:
+
+            name = "subplane{0}".format(str(random.randint(0, 99999)))
+
+        return name
+
+    def get_absolute_rect(self):
+        """Return a copy of Plane.rect in display coordinates.
+           The positions and Plane.scroll_offset of all parents are taken
+           into account.
+        """
+
+        rect = self.rect.copy()
+
+        parent = self.parent
+
+        while parent is not None:
+
+            scroll_offset = parent.scroll_offset
+
+            rect.move_ip(parent.rect.left + scroll_offset[0],
+                         parent.rect.top + scroll_offset[1])
+
+            parent = parent.parent
+
+        return rect
+
+    def count_planes(self):
+        """Return the number of Planes in the hierarchy starting at this Plane, including this Plane.
+        """
+
+        count = 0
+
+        pending_planes = [self]
+
+        while pending_planes:
+
+            plane = pending_planes.pop()
+
+            count += 1
+
+            pending_planes.extend(plane.subplanes.values())
+
+        return count
+
+    def __repr__(self):
+        """Readable string representation.
+        """
+
+        parent_name = "None"
+
+        if self.parent is not None:
+            parent_name = self.parent.name
+
+
+        repr_str = "<planes.Plane name='{0}' image={1} rect={2} parent='{3}' subplanes_list={4} draggable={5} grab={6} last_image_id={7} last_rect={8} left_click_callback={9} right_click_callback={10} dropped_upon_callback={11} sync_master_plane={12}>"
+
+        return repr_str.format(self.name,
+                               "{0}@{1}".format(self.image, id(self.image)),
+                               self.rect,
+                               parent_name,
+                               self.subplanes_list,
+                               self.draggable,
+                               self.grab,
+                               self.last_image_id,
+                               self.last_rect,
+                               self.left_click_callback,
+                               self.right_click_callback,
+                               self.dropped_upon_callback,
+                               self.sync_master_plane)
+
+# The implementations of Plane.render() and Plane.update() that do not
+# collect statistics, for restoring them in _instrument_planes().
+#
+Plane._render_lean = Plane.__dict__["render"]
+
+Plane._update_lean = Plane.__dict__["update"]
+
+def _instrument_planes(enabled):
+    """Install the instrumented Plane.render() and Plane.update() if enabled is True, the lean ones otherwise.
+       Called by Stats.enable() and Stats.disable().
+    """
+
+    if enabled:
+
+        Plane.render = Plane.__dict__["_render_instrumented"]
+
+        Plane.update = Plane.__dict__["_update_instrumented"]
+
+    else:
+        Plane.render = Plane.__dict__["_render_lean"]
+
+        Plane.update = Plane.__dict__["_update_lean"]
+
+    return
+
+class Display(Plane):
+    """planes main screen class.
+       A Display instance serves as the root Plane in planes.
+
+       Additional attributes:
+
+       Display.display
+           The Pygame display Surface
+
+       Display.dragged_plane
+           The currently dragged plane
+
+       Display.key_sensitive_plane
+           The Plane to be notified of Pygame keyboard events. Initially None.
+
+       Display.last_mouseover_plane
+           The last Plane a mouseover condition was found for. Initially None.
+
+       Display.mouseover_position
+           The mouse position of the last mouseover check. Initially None.
+
+       Display.mouseover_geometry_version
+           The value of GEOMETRY_VERSION at the last mouseover check.
+           Initially None.
+
+       Display.mouse_buttons
+           A dict mapping Pygame mouse button numbers to description strings.
+
+       Display.show_stats
+           Boolean flag to indicate whether to display performance statistics.
+           Set in Display.process() by examining user input. Initially False.
+           STATS is enabled while this is True, see Stats.enable().
+
+       Display.stats_interval
+           Seconds between refreshes of the statistics display text.
+           Initially 0.25, i.e. 4 times per second.
+
+       Display.font
+           A pygame.font.Font instance using the system default font.
+
+       Display.dirty_rendering
+           Boolean flag. If True, Display.render() will only redraw the
+           areas of the display that have changed since the last frame.
+           Initially the value of the dirty_rendering argument to
+           Display.__init__().
+
+       Display.max_dirty_rects
+           If there are more damaged areas than this after merging
+           overlapping ones, Display.render() will redraw their bounding
+           rect in one go instead. Initially 8.
+
+       Display.idle
+           Boolean flag. True if the last call to Display.render() found
+           nothing that had changed. Always False without
+           Display.dirty_rendering, as changes are not tracked then.
+           Initially False.
+
+       Display.running
+           Boolean flag. True while Display.run() is running. Set to False
+           to make it return after the current frame.
+
+       Display.clock
+           The pygame.time.Clock that Display.run() uses to limit the frame
+           rate. Its get_fps() returns the current frame rate.
+
+       Display.interpolation
+           The fraction of a simulation step that Display.run() has not yet
+           passed to Display.update() when rendering, from 0 to 1. Planes
+           may use it to interpolate their positions in render(). Initially
+           0.
+
+       Display.trace_frames
+           Number of frames to record a trace for when F11 is pressed.
+           The trace is written to planes_trace_<date>_<time>.json in the
+           current directory. See planes.trace. Initially 60.
+
+       Display.telemetry
+           An object whose sample() method is called with this Display at
+           the end of every Display.render(), before the statistics of the
+           frame are reset. See planes.telemetry.TelemetryServer.
+           Initially None.
+    """
+
+    def __init__(self, resolution_tuple, fullscreen = False, dirty_rendering = False):
+        """Calling pygame.display.set_mode().
+           If fullscreen is True, the display will use the full screen.
+           If dirty_rendering is True, Display.render() will only redraw
+           the areas that have changed. See Display.render().
+        """
+
+        # Init Pygame, just to be on the safe side.
+        # pygame.init() can safely be called more than once.
+        #
+        pygame.init()
+
+        self.display = self.create_display_surface(resolution_tuple, fullscreen)
+
+        Plane.__init__(self, "display", pygame.Rect((0, 0), resolution_tuple))
+
+        self.draggable = False
+
+        # Keep track of the dragged plane
+        #
+        self.dragged_plane = None
+
+        self.key_sensitive_plane = None
+
+        self.last_mouseover_plane = None
+
+        self.mouseover_position = None
+
+        self.mouseover_geometry_version = None
+
+        self.mouse_buttons = {1: "left",
+                              3: "right",
+                              4: "up",
+                              5: "down"}
+
+        self.show_stats = False
+
+        self.font = pygame.font.SysFont("Bitstream Vera Sans,DejaVu Sans,Verdana",
+                                        14)
+
+        # Convenience Surface for statistics display, in the pixel format
+        # of the display. See Display.render()
+        #
+        self._stats_surface = pygame.Surface((320, 600), 0, self.display)
+
+        # Make transparent. Currently has only a limited effect, since it might
+        # be blitted over itself in render().
+        #
+        self._stats_surface.set_alpha(196, pygame.RLEACCEL)
+
+        self.stats_interval = 0.25
+
+        # Pre-rendered labels and (text, Surface) tuples of the values on
+        # each line of the statistics overlay. See Display.draw_stats()
+        #
+        self._stats_labels = {}
+
+        self._stats_values = []
+
+        self.dirty_rendering = dirty_rendering
+
+        self.max_dirty_rects = 8
+
+        # Display areas covered by the dragged Plane and the statistics
+        # display in the last frame, to be restored in dirty rendering mode.
+        #
+        self._overlay_rects = []
+
+        # Whether the damage caches of all Planes are up to date, i.e.
+        # whether a frame has been rendered before.
+        #
+        self._damage_collected = False
+
+        self.idle = False
+
+        self.running = False
+
+        self.clock = pygame.time.Clock()
+
+        self.interpolation = 0
+
+        self.telemetry = None
+
+        self.trace_frames = 60
+
+        return
+
+    def create_display_surface(self, resolution_tuple, fullscreen):
+        """Call pygame.display.set_mode() and return the display Surface.
+           Called from Display.__init__().
+        """
+
+        # TODO: Use flags = pygame.HWSURFACE | pygame.DOUBLEBUF ?
+        #
+        flags = 0
+
+        if fullscreen:
+
+            flags = flags | pygame.FULLSCREEN
+
+        try:
+            display_surface = pygame.display.set_mode(resolution_tuple, flags)
+
+        except pygame.error:
+
+            # Microsoft Windows SDL error: "No available video device"
+            # For a list see
+            # http://wiki.libsdl.org/FAQUsingSDL
+            #
+            os.environ['SDL_VIDEODRIVER'] = 'windib'
+
+            display_surface = pygame.display.set_mode(resolution_tuple, flags)
+
+        return display_surface
+
+    def update(self):
+        """Call the base class method, and log the time it took in STATS.update_time.
+        """
+
+        starttime = TIMER_FUNC()
+
+        Plane.update(self)
+
+        STATS.update_time = TIMER_FUNC() - starttime
+
+        return
+
+    def get_show_stats(self):
+        """Return Display.show_stats.
+        """
+
+        return self._show_stats
+
+    def set_show_stats(self, show_stats):
+        """Show or hide the statistics overlay, and enable STATS while it is shown.
+        """
+
+        self._show_stats = show_stats
+
+        # Time Display.draw_stats() was last called, None to draw in the
+        # next frame
+        #
+        self._stats_drawn = None
+
+        if show_stats:
+
+            STATS.enable(self)
+
+        else:
+            STATS.disable(self)
+
+        return
+
+    show_stats = property(get_show_stats, set_show_stats)
+
+    def get_mouse_pos(self):
+        """Return the position of the mouse cursor, like pygame.mouse.get_pos().
+        """
+
+        return pygame.mouse.get_pos()
+
+    def get_mouse_pressed(self):
+        """Return the state of the mouse buttons, like pygame.mouse.get_pressed().
+        """
+
+        return pygame.mouse.get_pressed()
+
+    def show(self, dirty_rects):
+        """Make the areas given by the list of Rects dirty_rects visible on screen.
+           If Display.dirty_rendering is False, the whole display is updated.
+           Called from Display.run() after Display.render().
+        """
+
+        if self.dirty_rendering:
+
+            if dirty_rects:
+
+                pygame.display.update(dirty_rects)
+
+        else:
+            pygame.display.flip()
+
+        return
+
+    def key_sensitive(self, plane):
+        """Register the Plane given as sensitive to Pygame keyboard events.
+           Display will call plane.keydown(KEYDOWN_event) when a key is
+           pressed and the Plane has a parent.
+           plane.activate() will be called when the plane is registered.
+           plane.deactivate() will be called on the old plane.
+        """
+
+        # TODO: there should be a class containing keydown(), activate(), deactivate()
+
+        if self.key_sensitive_plane:
+
+            self.key_sensitive_plane.deactivate()
+
+        self.key_sensitive_plane = plane
+
+        self.key_sensitive_plane.activate()
+
+        return
+
+    def process(self, event_list):
+        """Process a pygame event list.
+           This is the main method of planes and should be called once per
+           frame.
+           It will also check mouseover conditions, even if event_list is empty.
+           The check is skipped if neither the mouse position nor
+           GEOMETRY_VERSION have changed since the last check.
+        """
+
+        # We will only process mouseovers when nothing else has happened.
+        # So we set up a flag here.
+        #
+        nothing_happened = True
+
+        for event in event_list:
+
+            if (event.type == pygame.MOUSEBUTTONDOWN
+                and event.button in self.mouse_buttons.keys()):
+
+                nothing_happened = False
+
+                clicked_plane = self.get_plane_at(event.pos)[0]
+
+                # Cant just compare to self in Python < 3.0.
+                # Use id instead.
+                #
+                if id(clicked_plane) != id(self):
+
+                    button_name = self.mouse_buttons[event.button]
+
+                    clicked_plane.wake()
+
+                    # Notify plane instance
+                    #
+                    clicked_plane.clicked(button_name)
+
+                    if button_name == "left" and clicked_plane.draggable:
+
+                        # Use a copy for new coordinates etc.
+                        #
+                        self.dragged_plane = Plane("dragged_plane", clicked_plane.rect.copy())
+
+                        # Drag a composite of the Plane and
+                        # all subplanes
+                        #
+                        self.dragged_plane.image = clicked_plane.image.copy()
+
+                        clicked_plane.render(self.dragged_plane.image,
+                                             pygame.Rect((0, 0), clicked_plane.rect.size))
+
+                        # Keep original for reference
+                        #
+                        self.dragged_plane.source = clicked_plane
+
+                        # 2/3 transparency. Only visible when there
+                        # are no per-pixel alphas.
+                        #
+                        self.dragged_plane.image.set_alpha(170, pygame.RLEACCEL)
+
+            elif (event.type == pygame.MOUSEBUTTONUP
+                  and event.button == 1):
+
+                # Left button == 1, right button == 3
+
+                nothing_happened = False
+
+                if self.dragged_plane is not None:
+
+                    target_plane, coordinates = self.get_plane_at(event.pos)
+
+                    # Don't drop to self
+                    # Cant compare Planes in Python < 3.0.
+                    # Use id instead.
+                    #
+                    if id(target_plane) != id(self.dragged_plane.source):
+
+                        target_plane.wake()
+
+                        self.dragged_plane.source.wake()
+
+                        target_plane.dropped_upon(self.dragged_plane.source, coordinates)
+
+                    # The next Display.render() draws without the dragged
+                    # Plane. The area of its last overlay is kept in
+                    # Display._overlay_rects and returned as dirty then.
+                    #
+                    self.dragged_plane = None
+
+            # Hardwire F12 key to stats display.
+            # Catch it before forwarding keys to key_sensitive_plane.
+            #
+            elif (event.type == pygame.KEYDOWN
+                  and event.key == pygame.K_F12):
+
+                # Reverse
+                #
+                if self.show_stats:
+
+                    self.show_stats = False
+
+                else:
+                    self.show_stats = True
+
+                    # Print the planes hierarchy to STDOUT
+                    # TODO: display on screen instead of STDOUT
+                    #
+                    def print_subplanes(plane, indent = 1):
+                        """Helper method to print an indented list of subplanes.
+                           To be called recursively.
+                        """
+                        if len(plane.subplanes):
+                            for subplane in plane.subplanes.values():
+                                print("|   " * (indent - 1) + "+---" + subplane.name)
+                                print_subplanes(subplane, indent + 1)
+                        return
+
+                    print("---------------------\nPlanes hierarchy dump\n---------------------")
+                    print(self.name)
+                    print_subplanes(self)
+
+            # Hardwire F11 key to record a trace of the next frames.
+            #
+            elif (event.type == pygame.KEYDOWN
+                  and event.key == pygame.K_F11):
+
+                from planes import trace
+
+                if trace.ACTIVE_TRACER is None:
+
+                    filename = "planes_trace_{0}.json".format(time.strftime("%Y%m%d_%H%M%S"))
+
+                    print("Recording a trace of {0} frames to {1}".format(self.trace_frames, filename))
+
+                    trace.Tracer(filename).start(self.trace_frames)
+
+            elif (event.type == pygame.KEYDOWN
+                  and self.key_sensitive_plane is not None
+                  and self.key_sensitive_plane.parent is not None):
+
+                nothing_happened = False
+
+                # TODO: remove a destroyed Plane from key_sensitive_plane
+
+                self.key_sensitive_plane.wake()
+
+                # Notify the latest registered listener
+                #
+                self.key_sensitive_plane.keydown(event)
+
+        # All events have been processed now. If nothing happened, process
+        # mouseover.
+        #
+        if nothing_happened:
+
+            try:
+
+                mouse_position = self.get_mouse_pos()
+
+            except pygame.error:
+
+                # This most probably means that Pygame has been shut down in the
+                # meantime.
+                #
+                return
+
+            if (mouse_position == self.mouseover_position
+                and GEOMETRY_VERSION == self.mouseover_geometry_version):
+
+                # Pointer and Planes did not move. No action.
+                #
+                return
+
+            self.mouseover_position = mouse_position
+
+            self.mouseover_geometry_version = GEOMETRY_VERSION
+
+            mouseover_plane = self.get_plane_at(mouse_position)[0]
+
+            if id(mouseover_plane) == id(self.last_mouseover_plane):
+
+                # Still over it. No action.
+                #
+                pass
+
+            else:
+
+                if self.last_mouseover_plane is not None:
+
+                    self.last_mouseover_plane.wake()
+
+                    self.last_mouseover_plane.mouseout_callback()
+
+                if id(mouseover_plane) == id(self):
+
+                    # Ignore the Display
+                    #
+                    self.last_mouseover_plane = None
+
+                else:
+
+                    mouseover_plane.wake()
+
+                    mouseover_plane.mouseover_callback()
+
+                    self.last_mouseover_plane = mouseover_plane
+
+        return
+
+    def render(self, force = False):
+        """Call base class render(), then blit to the Pygame display if something has changed.
+           If force is True, blit to Pygame display regardless.
+
+           Returns a list of pygame.Rect instances covering the areas of the
+           Pygame display that have been drawn to, suitable for
+           pygame.display.update().
+
+           If Display.dirty_rendering is False, the whole display is redrawn
+           and the list contains Display.rect only. Otherwise, only the
+           areas of Planes that have moved, been resized, changed their
+           image, been highlighted, added or removed are redrawn. Planes
+           that draw to their image in place must set Plane.last_rect to
+           None to be redrawn.
+        """
+
+        global _CHECK_COMPOSITES
+
+        starttime = TIMER_FUNC()
+
+        if self.dirty_rendering:
+
+            dirty_rects = self.get_dirty_rects(force)
+
+            self.idle = not dirty_rects
+
+            self._damage_collected = True
+
+        else:
+            # Skip the damage pass. Cached composites are checked while
+            # rendering, and dirty rendering starts with a full redraw.
+            #
+            dirty_rects = [self.rect.copy()]
+
+            self.idle = False
+
+            self._damage_collected = False
+
+        _CHECK_COMPOSITES = not self.dirty_rendering
+
+        STATS.dirty_rects = len(dirty_rects)
+
+        STATS.dirty_pixels = 0
+
+        for dirty_rect in dirty_rects:
+
+            STATS.dirty_pixels += dirty_rect.width * dirty_rect.height
+
+            self.display.set_clip(dirty_rect)
+
+            self.display.blit(self.image, (0, 0))
+
+            Plane.render(self, self.display, self.rect)
+
+        _CHECK_COMPOSITES = False
+
+        self.display.set_clip(None)
+
+        STATS.log_render_time(TIMER_FUNC() - starttime)
+
+        # Overlays are drawn unconditionally on top
+        #
+        overlay_rects = []
+
+        if self.dragged_plane is not None:
+
+            # For some reason MOUSEBUTTONUP is sometimes missed.
+            # Check whether button is still pressed
+            #
+            if any(self.get_mouse_pressed()):
+
+                # Dragged plane on top
+                #
+                self.dragged_plane.rect.center = self.get_mouse_pos()
+
+                overlay_rects.append(self.display.blit(self.dragged_plane.image,
+                                                       self.dragged_plane.rect))
+
+            else:
+                # Delete without dropping
+                #
+                self.dragged_plane = None
+
+        if self.show_stats:
+
+            # Refresh the text at most every Display.stats_interval seconds
+            #
+            now = TIMER_FUNC()
+
+            if self._stats_drawn is None or now - self._stats_drawn >= self.stats_interval:
+
+                self.draw_stats()
+
+                self._stats_drawn = now
+
+            overlay_rects.append(self.display.blit(self._stats_surface, (10, 10)))
+
+        if self.telemetry is not None:
+
+            self.telemetry.sample(self)
+
+        # Update and reset stats counters, also when they are not shown
+        #
+        STATS.update(self)
+
+        # Overlays must be removed in the next frame
+        #
+        if self.dirty_rendering:
+
+            dirty_rects.extend(overlay_rects)
+
+        self._overlay_rects = overlay_rects
+
+        return dirty_rects
+
+    def draw_stats(self):
+        """Draw the current STATS to the statistics overlay Surface.
+           Called by Display.render() every Display.stats_interval seconds
+           while Display.show_stats is True.
+
+           Labels are rendered once and cached. Values are only rendered
+           again when their text has changed.
+        """
+
+        # Font.render(text, antialias, color, background)
+
+        antialias = True
+
+        color = (255, 255, 255)
+
+        background = (64, 64, 64)
+
+        padding = 5
+
+        lineheight = self.font.get_height() + padding
+
+        STATS.total_planes = self.count_planes()
+
+        # (label, value) tuples
+        #
+        lines = [("planes {0} Runtime Statistics".format(VERSION), ""),
+                 ("Updated planes: ", "{0} of {1}".format(STATS.updated_planes, STATS.total_planes)),
+                 ("Culled planes: ", str(STATS.culled_planes)),
+                 ("Unconverted blits: ", str(STATS.unconverted_blits)),
+                 ("Surface allocations: ", str(STATS.surface_allocations)),
+                 ("Total pixels: ", "{0:.1f} M, {1:.2f} MB RGB video RAM".format(STATS.total_pixels / 1000000, STATS.total_pixels * 24 / 8 / 1024 / 1024)),
+                 ("Render time: ", "{0:.1f} ms".format(STATS.render_time * 1000)),
+                 ("Mean render time: ", "{0:.1f} ms".format(STATS.mean_render_time * 1000)),
+                 ("Mean rendering capacity: ", "{0} renderings / s".format(STATS.renders_per_second)),
+                 ("Frame time: ", "{0:.1f} ms, idle {1:.1f} ms, {2} updates dropped".format(STATS.frame_time * 1000, STATS.idle_time * 1000, STATS.dropped_updates)),
+                 ("Slowest planes, mean render time:", "")]
+
+        for time_name_tuple in STATS.slowest_planes:
+
+            lines.append(("    ", "{0}: {1:.1f} ms ({2} subplanes)".format(time_name_tuple[1],
+                                                                         time_name_tuple[0],
+                                                                         time_name_tuple[2])))
+
+        if len(self._stats_values) < len(lines):
+
+            self._stats_values.extend([None] * (len(lines) - len(self._stats_values)))
+
+        self._stats_surface.fill(background)
+
+        y = 3
+
+        for index, (label, value) in enumerate(lines):
+
+            label_surface = self._stats_labels.get(label)
+
+            if label_surface is None:
+
+                label_surface = self.font.render(label, antialias, color, background)
+
+                self._stats_labels[label] = label_surface
+
+            self._stats_surface.blit(label_surface, (padding, y))
+
+            if value:
+
+                # Cached (text, Surface) for this line
+                #
+                value_tuple = self._stats_values[index]
+
+                if value_tuple is None or value_tuple[0] != value:
+
+                    value_tuple = (value, self.font.render(value, antialias, color, background))
+
+                    self._stats_values[index] = value_tuple
+
+                self._stats_surface.blit(value_tuple[1], (padding + label_surface.get_width(), y))
+
+            y += lineheight
+
+        return
 
-        self.key_sensitive_plane = plane
+    def run(self, updates_per_second = 60, max_fps = 60, max_skipped_frames = 5, idle_timeout = 0.5):
+        """Run a main loop until a pygame.QUIT event arrives or Display.running is set to False.
 
-        self.key_sensitive_plane.activate()
+           Display.update() is called updates_per_second times per second
+           of real time, independent of the frame rate. Display.process()
+           and Display.render() are called once per frame, at most max_fps
+           times per second, using Display.clock. If rendering can not keep
+           up, up to max_skipped_frames updates are done per frame. Time
+           beyond that is dropped, which slows down the simulation.
 
-        return
+           When a frame brought no events and nothing to redraw, the loop
+           blocks in pygame.event.wait() until the next event arrives, or
+           for idle_timeout seconds at most. This requires
+           Display.dirty_rendering, see Display.idle. Time spent idle is not
+           passed on to the simulation.
 
-    def process(self, event_list):
-        """Process a pygame event list.
-           This is the main method of planes and should be called once per
-           frame.
-           It will also check mouseover conditions, even if event_list is empty.
+           Frame times and idle times are logged in STATS.
         """
 
-        # We will only process mouseovers when nothing else has happened.
-        # So we set up a flag here.
+        self.running = True
+
+        step = 1.0 / updates_per_second
+
+        # Simulation time not yet passed to Display.update()
         #
-        nothing_happened = True
+        lag = 0.0
 
-        for event in event_list:
+        previous_time = TIMER_FUNC()
 
-            if (event.type == pygame.MOUSEBUTTONDOWN
-                and event.button in self.mouse_buttons.keys()):
+        while self.running:
 
-                nothing_happened = False
+            frame_start = TIMER_FUNC()
 
-                clicked_plane = self.get_plane_at(event.pos)[0]
+            events = pygame.event.get()
 
-                # Cant just compare to self in Python < 3.0.
-                # Use id instead.
-                #
-                if id(clicked_plane) != id(self):
+            for event in events:
 
-                    button_name = self.mouse_buttons[event.button]
+                if event.type == pygame.QUIT:
 
-                    # Notify plane instance
-                    #
-                    clicked_plane.clicked(button_name)
+                    self.running = False
 
-                    if button_name == "left" and clicked_plane.draggable:
+            self.process(events)
 
-                        # Use a copy for new coordinates etc.
-                        #
-                        self.dragged_plane = Plane("dragged_plane", clicked_plane.rect.copy())
+            lag += frame_start - previous_time
 
-                        # Drag a composite of the Plane and
-                        # all subplanes
-                        #
-                        self.dragged_plane.image = clicked_plane.image.copy()
+            previous_time = frame_start
 
-                        clicked_plane.render(self.dragged_plane.image,
-                                             pygame.Rect((0, 0), clicked_plane.rect.size))
+            updates = 0
 
-                        # Keep original for reference
-                        #
-                        self.dragged_plane.source = clicked_plane
+            while lag >= step and updates < max_skipped_frames:
 
-                        # 2/3 transparency. Only visible when there
-                        # are no per-pixel alphas.
-                        #
-                        self.dragged_plane.image.set_alpha(170, pygame.RLEACCEL)
+                self.update()
 
-            elif (event.type == pygame.MOUSEBUTTONUP
-                  and event.button == 1):
+                lag -= step
 
-                # Left button == 1, right button == 3
+                updates += 1
 
-                nothing_happened = False
+            if lag >= step:
 
-                if self.dragged_plane is not None:
+                STATS.dropped_updates += int(lag / step)
 
-                    target_plane, coordinates = self.get_plane_at(event.pos)
+                lag = lag % step
 
-                    # Don't drop to self
-                    # Cant compare Planes in Python < 3.0.
-                    # Use id instead.
-                    #
-                    if id(target_plane) != id(self.dragged_plane.source):
+            self.interpolation = lag / step
 
-                        target_plane.dropped_upon(self.dragged_plane.source, coordinates)
+            self.show(self.render())
 
-                    self.dragged_plane = None
+            idle_start = TIMER_FUNC()
 
-                    # Render without dragged Plane and force-blit to Pygame
-                    # display
-                    #
-                    self.render(force = True)
+            STATS.frame_time = idle_start - frame_start
 
-            # Hardwire F12 key to stats display.
-            # Catch it before forwarding keys to key_sensitive_plane.
-            #
-            elif (event.type == pygame.KEYDOWN
-                  and event.key == pygame.K_F12):
+            self.clock.tick(max_fps)
 
-                # Reverse
-                #
-                if self.show_stats:
+            if self.idle and not events and self.running:
 
-                    self.show_stats = False
+                try:
+                    event = pygame.event.wait(int(idle_timeout * 1000))
 
-                else:
-                    self.show_stats = True
+                    if event.type != pygame.NOEVENT:
 
-                    # Print the planes hierarchy to STDOUT
-                    # TODO: display on screen instead of STDOUT
+                        pygame.event.post(event)
+
+                except TypeError:
+
+                    # Pygame < 2.0.1 can not wait with a timeout
                     #
-                    def print_subplanes(plane, indent = 1):
-                        """Helper method to print an indented list of subplanes.
-                           To be called recursively.
-                        """
-                        if len(plane.subplanes_list):
-                            for subplane in plane.subplanes.values():
-                                print("|   " * (indent - 1) + "+---" + subplane.name)
-                                print_subplanes(subplane, indent + 1)
-                        return
+                    pass
 
-                    print("---------------------\nPlanes hierarchy dump\n---------------------")
-                    print(self.name)
-                    print_subplanes(self)
+                # Do not catch up on the time spent idle
+                #
+                previous_time = TIMER_FUNC()
 
-            elif (event.type == pygame.KEYDOWN
-                  and self.key_sensitive_plane is not None
-                  and self.key_sensitive_plane.parent is not None):
+            STATS.idle_time = TIMER_FUNC() - idle_start
 
-                nothing_happened = False
+        return
 
-                # TODO: remove a destroyed Plane from key_sensitive_plane
+    def get_dirty_rects(self, force = False):
+        """Return a list of pygame.Rect instances covering the display areas that need to be redrawn.
 
-                # Notify the latest registered listener
-                #
-                self.key_sensitive_plane.keydown(event)
+           Overlapping areas are merged. If force is True, or if the
+           Display.image has changed, the list will contain Display.rect
+           only.
 
-        # All events have been processed now. If nothing happened, process
-        # mouseover.
-        #
-        if nothing_happened:
+           This updates the damage caches of all Planes, and is called by
+           Display.render() once per frame if Display.dirty_rendering is
+           set.
+        """
 
-            try:
+        damaged_rects = list(self._overlay_rects)
 
-                mouseover_plane = self.get_plane_at(pygame.mouse.get_pos())[0]
+        self.collect_damage((0, 0), damaged_rects)
 
-            except pygame.error:
+        if (force
+            or not self._damage_collected
+            or self.last_image_id != id(self.image)):
 
-                # This most probably means that Pygame has been shut down in the
-                # meantime.
-                #
-                return
+            self.last_image_id = id(self.image)
 
-            if id(mouseover_plane) == id(self.last_mouseover_plane):
+            return [self.rect.copy()]
 
-                # Still over it. No action.
-                #
-                pass
+        dirty_rects = []
 
-            else:
+        for rect in damaged_rects:
 
-                if self.last_mouseover_plane is not None:
+            rect = rect.clip(self.rect)
 
-                    self.last_mouseover_plane.mouseout_callback()
+            if not (rect.width and rect.height):
 
-                if id(mouseover_plane) == id(self):
+                continue
 
-                    # Ignore the Display
-                    #
-                    self.last_mouseover_plane = None
+            # Absorb all overlapping rects
+            #
+            index = rect.collidelist(dirty_rects)
 
-                else:
+            while index != -1:
 
-                    mouseover_plane.mouseover_callback()
+                rect = rect.union(dirty_rects.pop(index))
 
-                    self.last_mouseover_plane = mouseover_plane
+                index = rect.collidelist(dirty_rects)
 
-        return
+            dirty_rects.append(rect)
 
-    def render(self, force = False):
-        """Call base class render(), then blit to the Pygame display if something has changed.
-           If force is True, blit to Pygame display regardless.
-        """
+        if len(dirty_rects) > self.max_dirty_rects:
 
-        starttime = time.clock()
+            dirty_rects = [dirty_rects[0].unionall(dirty_rects[1:])]
 
-        self.display.blit(self.image, (0, 0))
+        return dirty_rects
 
-        rendered_something = Plane.render(self, self.display, self.rect)
 
-        STATS.log_render_time(time.clock() - starttime)
+class HeadlessDisplay(Display):
+    """A Display that renders to an offscreen Surface instead of a window.
 
-        if rendered_something or force or self.dragged_plane is not None:
+       Use it for tests, benchmarks and rendering on machines without a
+       screen. No display mode is set. If pygame.display has not been
+       initialised yet, the SDL dummy video driver is selected unless
+       SDL_VIDEODRIVER says otherwise, so Pygame events and image
+       conversion are available.
 
-            if self.dragged_plane is not None:
+       HeadlessDisplay.process() accepts synthetic events, created using
+       pygame.event.Event(). Mouse events are tracked to provide the
+       mouse position and buttons.
 
-                # For some reason MOUSEBUTTONUP is sometimes missed.
-                # Check whether button is still pressed
-                #
-                if pygame.mouse.get_pressed() != (0, 0, 0):
+       Additional attributes:
 
-                    # Dragged plane on top
-                    #
-                    self.dragged_plane.rect.center = pygame.mouse.get_pos()
+       HeadlessDisplay.mouse_pos
+           The mouse position from the last mouse event processed.
+           Initially (0, 0).
+
+       HeadlessDisplay.mouse_pressed
+           A list of flags for the left, middle and right mouse button,
+           from the mouse events processed. Initially all False.
+    """
 
-                    self.display.blit(self.dragged_plane.image,
-                                      self.dragged_plane.rect)
+    def __init__(self, resolution_tuple, dirty_rendering = False):
+        """Initialise, creating an offscreen Surface of the size given.
+           If dirty_rendering is True, Display.render() will only redraw
+           the areas that have changed.
+        """
 
-                else:
-                    # Delete without dropping
-                    #
-                    self.dragged_plane = None
+        if not pygame.display.get_init():
 
-        if self.show_stats:
+            os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
 
-            # Font.render(text, antialias, color, background)
+        self.mouse_pos = (0, 0)
 
-            antialias = True
+        self.mouse_pressed = [False, False, False]
 
-            color = (255, 255, 255)
+        Display.__init__(self, resolution_tuple, dirty_rendering = dirty_rendering)
+
+        return
 
-            background = (64, 64, 64)
+    def create_display_surface(self, resolution_tuple, fullscreen):
+        """Return a new 32 bit Surface of the size given, and make it the target format of convert_surface().
+        """
 
-            padding = 5
+        global _OFFSCREEN_SURFACE
 
-            lineheight = self.font.get_height() + padding
+        _OFFSCREEN_SURFACE = pygame.Surface(resolution_tuple, 0, 32)
 
-            self._stats_surface.fill(background)
+        return _OFFSCREEN_SURFACE
 
-            y = 3
+    def get_mouse_pos(self):
+        """Return HeadlessDisplay.mouse_pos.
+        """
 
-            self._stats_surface.blit(self.font.render("planes {0} Runtime Statistics".format(VERSION),
-                                                      antialias,
-                                                      color,
-                                                      background), (padding, y))
+        return self.mouse_pos
 
-            y += lineheight
+    def get_mouse_pressed(self):
+        """Return HeadlessDisplay.mouse_pressed.
+        """
 
-            self._stats_surface.blit(self.font.render("Total planes: {0}".format(STATS.total_planes),
-                                                      antialias,
-                                                      color,
-                                                      background), (padding, y))
+        return self.mouse_pressed
 
-            y += lineheight
+    def show(self, dirty_rects):
+        """There is no screen to show anything on. Do nothing.
+        """
 
-            self._stats_surface.blit(self.font.render("Total pixels: {0:.1f} M, {1:.2f} MB RGB video RAM".format(STATS.total_pixels / 1000000, STATS.total_pixels * 24 / 8 / 1024 / 1024),
-                                                      antialias,
-                                                      color,
-                                                      background), (padding, y))
+        return
 
-            y += lineheight
+    def process(self, event_list):
+        """Track the mouse position and buttons from the mouse events in event_list, then call the base class method.
+        """
 
-            self._stats_surface.blit(self.font.render("Render time: {0:.1f} ms".format(STATS.render_time * 1000),
-                                                      antialias,
-                                                      color,
-                                                      background), (padding, y))
+        for event in event_list:
 
-            y += lineheight
+            if event.type in (pygame.MOUSEMOTION,
+                              pygame.MOUSEBUTTONDOWN,
+                              pygame.MOUSEBUTTONUP):
 
-            self._stats_surface.blit(self.font.render("Mean render time: {0:.1f} ms".format(STATS.mean_render_time * 1000),
-                                                      antialias,
-                                                      color,
-                                                      background), (padding, y))
+                self.mouse_pos = event.pos
 
-            y += lineheight
+                if event.type != pygame.MOUSEMOTION and 1 <= event.button <= 3:
 
-            self._stats_surface.blit(self.font.render("Mean rendering capacity: {0} renderings / s".format(STATS.renders_per_second),
-                                                      antialias,
-                                                      color,
-                                                      background), (padding, y))
+                    self.mouse_pressed[event.button - 1] = event.type == pygame.MOUSEBUTTONDOWN
 
-            y += lineheight
+        Display.process(self, event_list)
 
-            self._stats_surface.blit(self.font.render("Accumulated subplane render times:",
-                                                      antialias,
-                                                      color,
-                                                      background), (padding, y))
+        return
 
-            STATS.plane_times.sort()
-            STATS.plane_times.reverse()
+    def get_buffer(self):
+        """Return a pygame.BufferProxy giving direct access to the pixels of the rendered display, without copying.
+           The pixel format is that of HeadlessDisplay.display.
+        """
 
-            msg = "    {0}: {1:.1f} ms ({2} subplanes)"
-                
-            # Use top ten
-            #
-            for time_name_tuple in STATS.plane_times[:10]:
+        return self.display.get_buffer()
 
-                y += lineheight
+    def tostring(self, format = "RGB"):
+        """Return a copy of the rendered display as a string of bytes, in the format given.
+           See pygame.image.tostring().
+        """
 
-                self._stats_surface.blit(self.font.render(msg.format(time_name_tuple[1],
-                                                                     time_name_tuple[0],
-                                                                     time_name_tuple[2]),
-                                                          antialias,
-                                                          color,
-                                                          background), (padding, y))
+        return pygame.image.tostring(self.display, format)
 
-            self.display.blit(self._stats_surface, (10, 10))
+    def save(self, filename):
+        """Save the rendered display to an image file, for example for thumbnails.
+           See pygame.image.save().
+        """
 
-            # Update and reset stats counter
-            #
-            STATS.update(self)
+        pygame.image.save(self.display, filename)
 
         return
 
-class Stats:
+class Stats(object):
     """A Stats instance stores and computes several runtime statistics.
 
        Attributes:
 
        Stats.total_planes
-           Total number of planes.
+           Total number of planes. Only counted while the statistics
+           overlay is shown.
+
+       Stats.updated_planes
+           Number of planes Plane.update() has been called for.
 
        Stats.total_pixels
            Total number of pixels allocated for all planes.
@@ -1041,55 +3297,227 @@ class Stats:
        Stats.render_time
            Time of last call to Display.render().
 
+       Stats.update_time
+           Time of last call to Display.update().
+
        Stats.mean_render_time
            Mean of the time of the last 30 calls to Display.render().
 
+       Stats.frame_time
+           Time of the last frame of Display.run(), excluding the time
+           spent waiting.
+
+       Stats.idle_time
+           Time Display.run() spent waiting after the last frame, to limit
+           the frame rate or for events when idle.
+
+       Stats.dropped_updates
+           Number of simulation steps Display.run() has dropped in total
+           because it could not keep up.
+
        Stats.renders_per_second
            Given Stats.mean_render_time, how many renders could be carried out
            in one second in theory. Note that this is not the actual FPS, which
            is largely determined by the application deploying the planes module.
 
        Stats.plane_times
-           A list of tuples (rendertime, name, subplane_count) giving
-           the last render time of each plane.
+           A dict mapping the id() of each Plane rendered in the current
+           frame to a list [rendertime, name, subplane_count]. Render
+           times of several calls to Plane.render() in one frame are added
+           up. Cleared by Stats.update().
+
+       Stats.slowest_planes
+           A list of at most Stats.SLOWEST_PLANES tuples (rendertime, name,
+           subplane_count), giving the planes with the highest mean render
+           time over the last frames, slowest first. Computed by
+           Stats.update() while Stats.enabled is True, and emptied when
+           disabled.
+
+       Stats.culled_planes
+           Number of subplanes that Plane.render() skipped, along with
+           their subplanes, because they were outside the clipping area.
+
+       Stats.unconverted_blits
+           Number of Plane images that Plane.render() blitted without
+           them being in the pixel format of the display.
+
+       Stats.dirty_rects
+           Number of display areas the last call to Display.render()
+           redrew.
+
+       Stats.dirty_pixels
+           Number of pixels in these areas.
+
+       Stats.composite_cache_hits
+           Number of times Plane.render() could blit the cached composite
+           of a Plane with Plane.cache_rendering set.
+
+       Stats.composite_cache_misses
+           Number of times the composite had to be recomposed.
+
+       Stats.surface_allocations
+           Number of Surfaces SURFACE_POOL allocated in the current frame,
+           because no Surface of the size requested was available. Zero
+           in steady state. Always counted.
+
+       Stats.enabled
+           Boolean flag, True while at least one user has called
+           Stats.enable(). Stats.updated_planes, Stats.total_pixels,
+           Stats.plane_times, Stats.slowest_planes, Stats.culled_planes,
+           Stats.unconverted_blits and the composite cache counters are
+           only collected while this is True. Otherwise, Plane.render()
+           and Plane.update() do not take any times or count anything.
+
+       Memory use is bounded: render times are kept in a ring buffer of
+       Stats.HISTORY values, and mean plane render times are dropped for
+       planes that have not been rendered for Stats.HISTORY frames, or
+       have been removed or destroyed.
     """
 
     # TODO: A Stats instance could be an iterator, yielding text Surfaces and rendering positions.
 
+    # Number of frames to compute means over
+    #
+    HISTORY = 30
+
+    # Length of Stats.slowest_planes
+    #
+    SLOWEST_PLANES = 10
+
     def __init__(self):
         """Initialise.
         """
 
         self.total_planes = 0
 
+        self.updated_planes = 0
+
         self.total_pixels = 0
 
         self.render_time = 0
 
-        self._render_time_list = []
+        self.update_time = 0
+
+        self._render_time_list = collections.deque(maxlen = self.HISTORY)
 
         self.mean_render_time = 0
 
         self.renders_per_second = 0
 
-        self.plane_times = []
+        self.frame_time = 0
+
+        self.idle_time = 0
+
+        self.dropped_updates = 0
+
+        self.plane_times = {}
+
+        self.slowest_planes = []
+
+        # {<id> : [<mean render time>, <name>, <subplane count>, <frame>]}
+        #
+        self._plane_means = {}
+
+        self._frame = 0
+
+        self.culled_planes = 0
+
+        self.unconverted_blits = 0
+
+        self.dirty_rects = 0
+
+        self.dirty_pixels = 0
+
+        self.composite_cache_hits = 0
+
+        self.composite_cache_misses = 0
+
+        self.surface_allocations = 0
+
+        self.enabled = False
+
+        # Objects that have called Stats.enable()
+        #
+        self._users = set()
+
+        return
+
+    def enable(self, user):
+        """Start collecting per-Plane statistics on behalf of user, e.g. a Display showing them.
+           Installs instrumented versions of Plane.render() and
+           Plane.update() if this is the first user.
+        """
+
+        self._users.add(user)
+
+        if not self.enabled:
+
+            self.enabled = True
+
+            _instrument_planes(True)
+
+        return
+
+    def disable(self, user):
+        """Stop collecting per-Plane statistics on behalf of user.
+           Restores the lean versions of Plane.render() and Plane.update()
+           when no user is left.
+        """
+
+        self._users.discard(user)
+
+        if self.enabled and not self._users:
+
+            self.enabled = False
+
+            _instrument_planes(False)
+
+            # Start afresh when enabled again
+            #
+            self.plane_times = {}
+
+            self._plane_means = {}
+
+            self.slowest_planes = []
 
         return
 
     def update(self, display):
         """Actively update stats from the display instance given, and reset frame-to-frame counters.
+           Called by Display.render() at the end of every frame.
         """
 
+        self._frame += 1
+
+        # Plane times are only collected, and the slowest planes only
+        # read, while enabled
+        #
+        if self.enabled:
+
+            self._update_slowest_planes()
+
         self.total_planes = 0
 
+        self.updated_planes = 0
+
         self.total_pixels = 0
 
-        self.plane_times = []
+        self.plane_times = {}
+
+        self.culled_planes = 0
+
+        self.unconverted_blits = 0
+
+        self.composite_cache_hits = 0
+
+        self.composite_cache_misses = 0
+
+        self.surface_allocations = 0
 
         # self.render_time will be entirely handled from the outside and
         # needs no reset.
 
-        if len(self._render_time_list):
+        if self._render_time_list:
 
             self.mean_render_time = sum(self._render_time_list) / len(self._render_time_list)
 
@@ -1099,19 +3527,93 @@ class Stats:
 
         return
 
+    def _update_slowest_planes(self):
+        """Add Stats.plane_times to the mean plane render times, and compute Stats.slowest_planes.
+        """
+
+        # Exponential moving average over about Stats.HISTORY frames
+        #
+        weight = 1.0 / self.HISTORY
+
+        plane_means = self._plane_means
+
+        for key, (render_time, name, subplane_count) in self.plane_times.items():
+
+            if key in plane_means:
+
+                entry = plane_means[key]
+
+                entry[0] += (render_time - entry[0]) * weight
+
+                entry[1] = name
+
+                entry[2] = subplane_count
+
+                entry[3] = self._frame
+
+            else:
+                plane_means[key] = [render_time, name, subplane_count, self._frame]
+
+        if self._frame % self.HISTORY == 0:
+
+            oldest_frame = self._frame - self.HISTORY
+
+            for key in [key for key, entry in plane_means.items() if entry[3] <= oldest_frame]:
+
+                del plane_means[key]
+
+        self.slowest_planes = [tuple(entry[:3]) for entry in heapq.nlargest(self.SLOWEST_PLANES,
+                                                                            plane_means.values())]
+
+        return
+
+    def forget_plane(self, plane):
+        """Drop the render times of plane and its subplanes, so they are not attributed to a later Plane with the same id().
+           Called by Plane.remove() and Plane.destroy().
+        """
+
+        if not (self.plane_times or self._plane_means):
+
+            return
+
+        planes = [plane]
+
+        while planes:
+
+            plane = planes.pop()
+
+            self.plane_times.pop(id(plane), None)
+
+            self._plane_means.pop(id(plane), None)
+
+            planes.extend(plane.subplanes.values())
+
+        return
+
     def log_render_time(self, render_time):
         """Set Stats.render_time to the time given, and register that time for computing the mean.
         """
 
-        self. render_time = render_time
+        self.render_time = render_time
 
+        # Keeps the last Stats.HISTORY values
+        #
         self._render_time_list.append(render_time)
 
-        # Keep it at 30 values
-        #
-        if len(self._render_time_list) > 30:
+        return
+
+    def log_plane_time(self, plane, render_time):
+        """Add render_time, in milliseconds, to the render time of plane in the current frame.
+        """
 
-            self._render_time_list.pop(0)
+        entry = self.plane_times.get(id(plane))
+
+        if entry is None:
+
+            self.plane_times[id(plane)] = [render_time, plane.name, len(plane.subplanes)]
+
+        else:
+            entry[0] += render_time
 
         return
 
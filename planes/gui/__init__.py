@@ -42,6 +42,10 @@ import sys
 import unicodedata
 import zipfile
 
+# The slot of planes.Plane.rect, wrapped by Container.rect
+#
+_PLANE_RECT = planes.Plane.rect
+
 BACKGROUND_COLOR = (150, 150, 150)
 HIGHLIGHT_COLOR = (191, 95, 0)
 
@@ -662,6 +666,12 @@ class Container(planes.Plane):
     """A Container for Planes.
        If a subplane is added via sub(), the container places it below any existing
        subplanes and resizes itself to fit the width and height of the subplanes.
+       Use extend() to add many subplanes at once.
+
+       Layout is deferred: sub(), extend() and remove() only mark the
+       layout of the Container and of all Containers above it as pending.
+       It is computed once by Container.layout() when Container.rect is
+       read next, at the latest when the Container is rendered.
 
        Additional attributes:
 
@@ -677,6 +687,15 @@ class Container(planes.Plane):
            Container.image is initialised to a 0x0 px Surface.
         """
 
+        # Read by Container.rect
+        #
+        self._layout_pending = False
+
+        # Whether subplanes have been removed since the last layout, so the
+        # Container may shrink
+        #
+        self._layout_shrink = False
+
         # Call base class
         #
         planes.Plane.__init__(self, name, pygame.Rect((0, 0), (0, 0)))
@@ -691,145 +710,162 @@ class Container(planes.Plane):
 
         return
 
+    def get_rect(self):
+        """Return Container.rect, calling Container.layout() first if the layout is pending.
+           Returns None after Plane.destroy().
+        """
+
+        rect = _PLANE_RECT.__get__(self)
+
+        if self._layout_pending and rect is not None:
+
+            self.layout()
+
+            rect = _PLANE_RECT.__get__(self)
+
+        return rect
+
+    def set_rect(self, rect):
+        """Set Container.rect.
+        """
+
+        _PLANE_RECT.__set__(self, rect)
+
+        return
+
+    rect = property(get_rect, set_rect)
+
     def redraw(self):
         """Redraw Container.image from the dimensions in Containter.rect.
-           This also creates a new Container.rendersurface.
+           The image is taken from planes.SURFACE_POOL, and drawn to in
+           place if the size has not changed.
         """
 
-        # Create Surface with background color
-        #
+        flags = 0
+
         if len(self.background_color) == 4:
 
-            self.image = pygame.Surface(self.rect.size,
-                                        flags = pygame.SRCALPHA)
+            flags = pygame.SRCALPHA
 
-        else:
+        image = planes.SURFACE_POOL.reuse(self.image, self.rect.size, flags)
+
+        if image is not self.image:
 
-            self.image = pygame.Surface(self.rect.size)
+            self.image = image
 
+        # Fill with background color
+        #
         self.image.fill(self.background_color)
 
+        # Force redraw in render(), even if the image is reused
+        #
+        self.last_image_id = None
+
         # Only draw a border if there is no alpha channel.
         #
         if len(self.background_color) == 3:
 
             draw_border(self, (0, 0, 0))
 
-        # Create a new rendersurface
-        #
-        self.rendersurface = self.image.copy()
-
         return
 
     def sub(self, plane):
-        """Resize the container, update the position of plane and add it as a subplane.
+        """Add plane as a subplane, to be placed below any existing subplanes in the next layout.
         """
 
-        # Cares for re-adding an already existing subplane.
-        #
-        existing_rect = pygame.Rect((0, 0), (0, 0))
-
-        if plane.name in self.subplanes_list:
-
-            # Collision!
-            #
-            existing_rect = self.subplanes[plane.name].rect
-
-        # First add the subplane by calling the base class method.
-        #
         planes.Plane.sub(self, plane)
 
-        if plane.rect == existing_rect:
+        self.request_layout()
 
-            # Oh yeah, in that case, no adjustments required
-            #
-            self.redraw()
-
-            return
-
-        # Containers have a 1px black border. Observe this when calculating width
-        # and height.
-        # Existing subplanes are already incorporated in self.rect.
-
-        # Conditionally fit new width
-        #
-        if plane.rect.width > self.rect.width - 2 * self.padding - 2:
+        return
 
-            self.rect.width = plane.rect.width + 2 * self.padding + 2
+    def extend(self, plane_list):
+        """Add all Planes in plane_list as subplanes, in order, like Container.sub().
+        """
 
-        # Mandatory fit new height, observe padding
-        #
-        if not self.rect.height:
+        for plane in plane_list:
 
-            # No subplanes yet
+            planes.Plane.sub(self, plane)
 
-            plane.rect.topleft = (0, 1 + self.padding)
+        self.request_layout()
 
-            self.rect.height = plane.rect.height + 2 * self.padding + 2
+        return
 
-        else:
-            plane.rect.topleft = (0, self.rect.height - 1)
+    def request_layout(self):
+        """Mark the layout of this Container and of all Containers above it as pending.
+        """
 
-            self.rect.height = self.rect.height + plane.rect.height - existing_rect.height + self.padding
+        container = self
 
-        # Re-center all subplanes.
-        #
-        for name in self.subplanes_list:
+        while isinstance(container, Container):
 
-            rect = self.subplanes[name].rect
-            rect.centerx = int(self.rect.width / 2)
+            container._layout_pending = True
 
-        self.redraw()
+            container = container.parent
 
         return
 
-    def remove(self, plane_identifier):
-        """Remove the subplane, then reposition remaining subplanes and resize the container.
+    def layout(self):
+        """Position all subplanes below each other, resize the Container to fit them and redraw.
+           Called when Container.rect is read while the layout is pending.
         """
 
-        # Accept Plane name as well as Plane instance
+        # Reading the rect below must not lay out again
         #
-        if isinstance(plane_identifier, planes.Plane):
+        self._layout_pending = False
 
-            name = plane_identifier.name
+        rect = _PLANE_RECT.__get__(self)
 
-        else:
-            name = plane_identifier
+        subplane_list = self.subplanes.values()
 
-        # Save the height of the removed plane
+        # Containers have a 1px black border. Observe this when calculating
+        # width and height.
         #
-        height_removed = self.subplanes[name].rect.height + self.padding
+        width = 0
 
-        planes.Plane.remove(self, name)
+        if subplane_list:
+
+            width = max(plane.rect.width for plane in subplane_list) + 2 * self.padding + 2
+
+        if self._layout_shrink:
+
+            rect.width = max(4, width)
+
+        else:
+            rect.width = max(rect.width, width)
 
-        # Reposition remaining subplanes.
-        #
         top = 1 + self.padding
 
-        for name in self.subplanes_list:
-            rect = self.subplanes[name].rect
-            rect.top = top
-            top = top + rect.height + self.padding
+        for plane in subplane_list:
 
-        # Now shrink and redraw.
-        #
-        self.rect.height = self.rect.height - height_removed
+            plane.rect.topleft = (0, top)
 
-        # Find widest subplane.
-        # Partly copied from Container.sub().
-        #
-        self.rect.width = 4
+            plane.rect.centerx = int(rect.width / 2)
 
-        for plane in self.subplanes.values():
+            top = top + plane.rect.height + self.padding
 
-            if plane.rect.width > self.rect.width - 2 * self.padding - 2:
+        if subplane_list or self._layout_shrink:
 
-                self.rect.width = plane.rect.width + 2 * self.padding + 2
+            rect.height = top + 1
+
+        self._layout_shrink = False
 
         self.redraw()
 
         return
 
+    def remove(self, plane_identifier):
+        """Remove the subplane, to reposition the remaining subplanes and shrink the container in the next layout.
+        """
+
+        planes.Plane.remove(self, plane_identifier)
+
+        self._layout_shrink = True
+
+        self.request_layout()
+
+        return
+
     def remove_all(self):
         """Remove all subplanes and shrink accordingly.
         """
@@ -896,15 +932,19 @@ class OptionList(Container):
 
         # Add options
         #
-        for text in option_list:
+        options = []
+
+        for index, text in enumerate(option_list):
 
-            option = Option("option" + str(option_list.index(text)),
+            option = Option("option" + str(index),
                             text,
                             pygame.Rect((0, 0), (width, lineheight)))
 
             option.highlight = True
 
-            self.sub(option)
+            options.append(option)
+
+        self.extend(options)
 
         self.option0.current_color = HIGHLIGHT_COLOR
         self.selected = self.option0
@@ -1249,12 +1289,10 @@ class ScrollingPlane(planes.Plane):
             self.scrollbar_container.scrollbar.rect.top = new_y
 
             content_plane = self.content.subplanes[self.content.subplanes_list[0]]
-            content_plane.rect.top = int(0 - new_y / self.rect.height * content_plane.rect.height)
 
-            # Invalidate last_image_id to trigger a redraw
-            # TODO: changing content_plane.rect.top above should invalidate last_rect, why is this necessary?
+            # Scroll at render time. The content plane stays in place.
             #
-            content_plane.last_image_id = None
+            self.content.scroll_offset = (0, int(0 - new_y / self.rect.height * content_plane.rect.height))
 
             return
 
@@ -1273,6 +1311,273 @@ class ScrollingPlane(planes.Plane):
 
         return
 
+class VirtualScrollingPlane(planes.Plane):
+    """A fixed-dimension plane with a scroll bar, showing rows provided by a data source.
+
+       Only the rows in view, plus VirtualScrollingPlane.overscan rows
+       above and below, exist as Planes. Rows scrolled out of view are
+       handed back to the row factory to be reused, so memory use and
+       render time do not depend on the number of rows.
+
+       Subplane structure:
+
+       VirtualScrollingPlane
+       |
+       +---content
+       |   |
+       |   +---row<index>
+       |   |
+       |   +---...
+       |
+       +---scrollbar_container
+           |
+           +---scrollbar
+
+       The rows are placed at their full list position in content, which
+       is scrolled using Plane.scroll_offset.
+
+       Additional attributes:
+
+       VirtualScrollingPlane.row_count
+           Number of rows in the data source. Call
+           VirtualScrollingPlane.refresh() after changing it.
+
+       VirtualScrollingPlane.row_height
+           Height of each row in pixels.
+
+       VirtualScrollingPlane.row_factory
+           Callback row_factory(index, plane), returning a Plane for the
+           row with the index given. plane is a Plane that is no longer in
+           view and can be redrawn and returned, or None.
+
+       VirtualScrollingPlane.overscan
+           Number of rows kept above and below the visible ones.
+
+       VirtualScrollingPlane.scroll_y
+           The vertical scroll position in pixels. Use
+           VirtualScrollingPlane.scroll_to() to change it.
+    """
+
+    def __init__(self, name, rect, row_count, row_height, row_factory, overscan = 2, draggable = False, grab = False, clicked_callback = None, dropped_upon_callback = None):
+        """Initialise.
+           rect states the dimensions without the scroll bar.
+           row_height must be at least 1. Raises a ValueError otherwise.
+        """
+
+        if row_height < 1:
+
+            raise ValueError("'row_height' must be at least 1, not {0}".format(row_height))
+
+        rect.width = rect.width + 12
+
+        # Call base class
+        #
+        planes.Plane.__init__(self,
+                              name,
+                              rect,
+                              draggable = draggable,
+                              grab = grab,
+                              left_click_callback = clicked_callback,
+                              dropped_upon_callback = dropped_upon_callback)
+
+        self.image.fill(BACKGROUND_COLOR)
+
+        self.row_count = row_count
+
+        self.row_height = row_height
+
+        self.row_factory = row_factory
+
+        self.overscan = overscan
+
+        self.scroll_y = 0
+
+        # {<row index> : <Plane>}
+        #
+        self._rows = {}
+
+        self.sub(planes.Plane("content", pygame.Rect((0, 0),
+                                                     (self.rect.width - 12, self.rect.height))))
+
+        scrollbar_container = planes.Plane("scrollbar_container",
+                                           pygame.Rect((self.rect.width - 12, 0),
+                                                       (12, self.rect.height)))
+
+        scrollbar_container.image.fill(BACKGROUND_COLOR)
+        draw_border(scrollbar_container, (0, 0, 0))
+
+        def scrollbar_container_clicked(plane):
+            """Clicked callback which scrolls according to the y-position of the mouse.
+            """
+
+            # Clicks are dispatched by Display.process(), which makes the
+            # Display the root Plane. Display.get_mouse_pos() also works
+            # with a HeadlessDisplay.
+            #
+            display = plane
+
+            while display.parent is not None:
+
+                display = display.parent
+
+            x, y = display.get_mouse_pos()
+
+            track_height = plane.rect.height - 4 - plane.scrollbar.rect.height
+
+            if track_height > 0:
+
+                self.scroll_to((y - plane.get_absolute_rect().top - 2) / float(track_height) * self.get_max_scroll_y())
+
+            return
+
+        scrollbar_container.left_click_callback = scrollbar_container_clicked
+
+        self.sub(scrollbar_container)
+
+        self.scrollbar_container.sub(planes.Plane("scrollbar", pygame.Rect((2, 2), (8, 8))))
+
+        self.refresh()
+
+        return
+
+    def get_max_scroll_y(self):
+        """Return the largest possible value of VirtualScrollingPlane.scroll_y.
+        """
+
+        return max(0, self.row_count * self.row_height - self.content.rect.height)
+
+    def scroll_to(self, scroll_y):
+        """Scroll to the vertical position given in pixels, clamped to the rows available.
+        """
+
+        self.scroll_y = int(min(max(0, scroll_y), self.get_max_scroll_y()))
+
+        self.content.scroll_offset = (0, 0 - self.scroll_y)
+
+        self.update_rows()
+
+        self.update_scrollbar()
+
+        return
+
+    def refresh(self):
+        """Request all live rows from VirtualScrollingPlane.row_factory again, e.g. after the data source has changed.
+        """
+
+        previous_rows = list(self._rows.keys())
+
+        # Drop rows beyond a changed VirtualScrollingPlane.row_count, and
+        # create missing ones
+        #
+        self.scroll_to(self.scroll_y)
+
+        for index in previous_rows:
+
+            if index in self._rows:
+
+                self._rows[index] = self.row_factory(index, self._rows[index])
+
+                self._place_row(index, self._rows[index])
+
+        return
+
+    def update_rows(self):
+        """Make sure exactly the rows in view plus overscan are live, reusing rows no longer in view.
+        """
+
+        first = max(0, self.scroll_y // self.row_height - self.overscan)
+
+        last = min(self.row_count,
+                   (self.scroll_y + self.content.rect.height) // self.row_height + 1 + self.overscan)
+
+        recycled_rows = []
+
+        for index in list(self._rows.keys()):
+
+            if index < first or index >= last:
+
+                recycled_rows.append(self._rows.pop(index))
+
+        for index in range(first, last):
+
+            if index not in self._rows:
+
+                recycled_row = None
+
+                if recycled_rows:
+
+                    recycled_row = recycled_rows.pop()
+
+                plane = self.row_factory(index, recycled_row)
+
+                if recycled_row is not None and plane is not recycled_row:
+
+                    self.content.remove(recycled_row.name)
+
+                self._rows[index] = plane
+
+                self._place_row(index, plane)
+
+        # Rows not reused are dropped
+        #
+        for plane in recycled_rows:
+
+            self.content.remove(plane.name)
+
+        return
+
+    def update_scrollbar(self):
+        """Resize and position the scroll bar to reflect the rows in view.
+        """
+
+        scrollbar = self.scrollbar_container.scrollbar
+
+        track_height = self.rect.height - 4
+
+        total_height = max(1, self.row_count * self.row_height)
+
+        height = max(8, min(track_height, int(self.content.rect.height / float(total_height) * track_height)))
+
+        top = 2
+
+        if self.get_max_scroll_y():
+
+            top = 2 + int(self.scroll_y / float(self.get_max_scroll_y()) * (track_height - height))
+
+        if scrollbar.rect.height != height:
+
+            scrollbar.image = pygame.Surface((8, height))
+
+            # Half-bright color taken from Button.clicked()
+            #
+            scrollbar.image.fill(list(map(lambda i : int(i * 0.5), BACKGROUND_COLOR)))
+
+            scrollbar.rect.height = height
+
+        scrollbar.rect.top = top
+
+        return
+
+    def _place_row(self, index, plane):
+        """Name and position plane as the row with the index given, and make it a subplane of content.
+        """
+
+        name = "row{0}".format(index)
+
+        if plane.parent is self.content and plane.name != name:
+
+            self.content.remove(plane.name)
+
+        plane.name = name
+
+        plane.rect.topleft = (0, index * self.row_height)
+
+        if plane.parent is not self.content:
+
+            self.content.sub(plane)
+
+        return
+
 class PlusMinusBox(planes.Plane):
     """This class implements a TextBox with plus and minus buttons attached, to change a numerical value.
        The value is accessible as PlusMinusBox.textbox.text
@@ -1374,6 +1679,14 @@ class FadingContainer(Container):
            A list of decreasing alpha values to be applied to the
            Surface of the FadingContainer, computed from fade_duration
            in FadingContainer.__init__().
+
+       FadingContainer.alpha
+           The alpha value currently applied, taken from
+           FadingContainer.alpha_steps in FadingContainer.update(). None
+           while the FadingContainer is displayed without fading.
+
+       FadingContainer.cache_rendering is set to True, so the alpha values
+       can be applied to the composite in FadingContainer.rendersurface.
     """
 
     # TODO: Couldn't this be an abstract add-in for all kinds of GUI elements? So just inheriting from e.g. FadingElement would add this behaviour? Or a decorator like @Fading?
@@ -1397,14 +1710,19 @@ class FadingContainer(Container):
         #
         Container.__init__(self, name, padding, background_color)
 
+        self.cache_rendering = True
+
         self.display_duration = display_duration
 
         self.alpha_steps = list(range(255, 0, -int(255 / fade_duration)))
 
+        self.alpha = None
+
         return
 
     def update(self):
-        """Call Plane.update(), then decrement FadingContainer.display_duration and destroy when len(self.alpha_steps) has reached zero.
+        """Call Plane.update(), then decrement FadingContainer.display_duration, and then take the next FadingContainer.alpha from FadingContainer.alpha_steps.
+           Destroy when len(self.alpha_steps) has reached zero.
         """
 
         # Call base class
@@ -1421,17 +1739,27 @@ class FadingContainer(Container):
 
                 self.destroy()
 
+            else:
+                # Advance once per frame, and force a new composite in
+                # render() to apply the alpha value
+                #
+                self.alpha = self.alpha_steps.pop(0)
+
+                self.last_rect = None
+
         return
 
     def render(self, rendersurface, offset_rect):
-        """Call Plane.render(), the pop the first value from self.alpha_steps and apply it as alpha.
+        """Call Plane.render(), then apply FadingContainer.alpha.
+           This is called when FadingContainer.rendersurface is recomposed,
+           which may happen more than once per frame.
         """
 
         # Call base class
         #
         planes.Plane.render(self, rendersurface, offset_rect)
 
-        if self.display_duration <= 0:
+        if self.alpha is not None and self.rendersurface is not None:
 
             # Only fade if the fade is actually visible, i.e. no per-pixel alpha.
             # TODO: Implement fading for Surfaces with per-pixel alpha. Replace transparent pixels with transparent color, convert the Surface to a no-SRCALPHA Surface.
@@ -1443,7 +1771,7 @@ class FadingContainer(Container):
                 self.alpha_steps = []
 
             else:
-                self.rendersurface.set_alpha(self.alpha_steps.pop(0))
+                self.rendersurface.set_alpha(self.alpha)
 
         # Always return True to force a redraw
         #
@@ -1528,7 +1856,15 @@ class ProgressBar(planes.Plane):
         #
         if self.background_color is None:
 
-            self.image = pygame.Surface(self.rect.size, flags = pygame.SRCALPHA)
+            # Clear the image in place, unless the size has changed
+            #
+            image = planes.SURFACE_POOL.reuse(self.image, self.rect.size, pygame.SRCALPHA)
+
+            if image is not self.image:
+
+                self.image = image
+
+            self.image.fill((0, 0, 0, 0))
 
         else:
             self.image.fill(self.background_color)
@@ -189,10 +189,11 @@ class LMRWidget:
         mid_width = width - left_width - style.right_img.get_width()
 
         # Create background image
-        # Default to SRCALPHA.
+        # Default to SRCALPHA. Plane.image will be converted to the display
+        # format on assignment, so this works without a display mode.
         #
         self.background = pygame.Surface((width, height),
-                                         flags = pygame.SRCALPHA).convert_alpha()
+                                         flags = pygame.SRCALPHA)
 
         self.background.blit(style.left_img, (0, 0))
 
@@ -431,16 +432,20 @@ class LMROptionList(planes.gui.OptionList):
 
         # Add options
         #
-        for text in option_list:
+        options = []
 
-            option = LMROption("option" + str(option_list.index(text)),
+        for index, text in enumerate(option_list):
+
+            option = LMROption("option" + str(index),
                                text,
                                width,
                                option_style)
 
             option.highlight = True
 
-            self.sub(option)
+            options.append(option)
+
+        self.extend(options)
 
         self.option0.background = self.highlighted_background
         self.selected = self.option0
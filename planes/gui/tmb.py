@@ -120,7 +120,8 @@ class TMBContainer(planes.gui.Container):
 
        TMBContainer.background
            A Pygame Surface, holding the rendered background.
-           Initially None, repainted in TMBContainer.sub().
+           Initially None, repainted in TMBContainer.layout() when the
+           size or TMBContainer.style have changed.
     """
 
     def __init__(self, name, style, padding = 0, colorkey = None):
@@ -146,6 +147,10 @@ class TMBContainer(planes.gui.Container):
 
         self.background = None
 
+        # The style TMBContainer.background has been painted with
+        #
+        self._background_style = None
+
         # Initialise rect width. This is fixed to the background width.
         #
         self.rect.width = self.style.top_img.get_width()
@@ -154,76 +159,94 @@ class TMBContainer(planes.gui.Container):
 
         return
 
-    def sub(self, plane):
-        """Resize the container, update the position of plane and add it as a subplane.
-           This will also repaint TMBContainer.background.
+    def layout(self):
+        """Position all subplanes below each other, resize the container to fit them and repaint TMBContainer.background if needed.
+           Called when TMBContainer.rect is read while the layout is
+           pending. The width is fixed.
         """
 
         # Adapted from gui.Container method
 
-        # First add the subplane by calling the base class method.
-        # This also cares for re-adding an already existing subplane.
+        # Reading the rect below must not lay out again
         #
-        planes.Plane.sub(self, plane)
+        self._layout_pending = False
+
+        rect = planes.gui._PLANE_RECT.__get__(self)
 
-        # Existing subplanes are already incorporated in self.rect.
+        subplane_list = self.subplanes.values()
 
         # We need it a couple of times
         #
         top_height = self.style.top_img.get_height()
 
-        # Mandatory fit new height, observe padding
+        # Padding between elements, but not at top and bottom
         #
-        if not self.rect.height:
+        top = top_height
 
-            # No subplanes yet
+        for plane in subplane_list:
 
-            plane.rect.topleft = (0, top_height)
+            plane.rect.topleft = (0, top)
 
-            # No padding at the bottom
-            #
-            self.rect.height = top_height + plane.rect.height + self.style.bottom_img.get_height()
+            plane.rect.centerx = int(rect.width / 2)
+
+            top = top + plane.rect.height + self.padding
+
+        if subplane_list:
+
+            rect.height = top - self.padding + self.style.bottom_img.get_height()
+
+        elif self._layout_shrink:
+
+            rect.height = top_height + self.style.bottom_img.get_height()
 
         else:
-            # Padding between elements
+            # Nothing to paint
             #
-            plane.rect.topleft = (0, self.rect.height - self.style.bottom_img.get_height() + self.padding)
+            return
 
-            self.rect.height = self.rect.height + self.padding + plane.rect.height
+        self._layout_shrink = False
 
-        # Center subplane.
+        # Reuse the background Surface if the size is unchanged.
+        # Default to SRCALPHA. Plane.image will be converted to the display
+        # format on assignment, so this works without a display mode.
         #
-        plane.rect.centerx = int(self.rect.width / 2)
+        background = planes.SURFACE_POOL.reuse(self.background,
+                                               rect.size,
+                                               pygame.SRCALPHA)
 
-        # Recreate background
-        # Default to SRCALPHA.
+        # Only repaint if size or style have changed
         #
-        self.background = pygame.Surface(self.rect.size,
-                                         flags = pygame.SRCALPHA).convert_alpha()
+        if background is not self.background or self._background_style is not self.style:
 
-        self.background.blit(self.style.top_img, (0, 0))
+            self.background = background
 
-        # Python: this creates a copy
-        #
-        y = top_height
+            self._background_style = self.style
 
-        mid_img_height = self.style.mid_img.get_height()
+            self.background.fill((0, 0, 0, 0))
 
-        top_mid_height = self.rect.height - self.style.bottom_img.get_height()
+            self.background.blit(self.style.top_img, (0, 0))
 
-        while y < (top_mid_height):
+            # Tile the middle image below the top image
+            #
+            y = top_height
 
-            self.background.blit(self.style.mid_img, (0, y))
+            mid_img_height = self.style.mid_img.get_height()
 
-            y += mid_img_height
+            top_mid_height = rect.height - self.style.bottom_img.get_height()
 
-        # Clear area for bottom edge
-        #
-        self.background.fill((128, 128, 128, 0),
-                             rect = pygame.Rect((0, top_mid_height),
-                                                self.style.bottom_img.get_size()))
+            while y < (top_mid_height):
 
-        self.background.blit(self.style.bottom_img, (0, top_mid_height))
+                self.background.blit(self.style.mid_img, (0, y))
+
+                y += mid_img_height
+
+            # Clear area for bottom edge
+            #
+            self.background.fill((128, 128, 128, 0),
+                                 rect = pygame.Rect((0, top_mid_height),
+                                                    self.style.bottom_img.get_size()))
+
+            self.background.blit(self.style.bottom_img, (0, top_mid_height))
 
         self.redraw()
 
@@ -231,63 +254,51 @@ class TMBContainer(planes.gui.Container):
 
     def redraw(self):
         """Redraw TMBContainer.image using TMBContainer.background.
-           This also creates a new TMBContainer.rendersurface.
+           The image is taken from planes.SURFACE_POOL, and drawn to in
+           place if the size has not changed.
         """
 
+        size = self.background.get_size()
+
         if self.colorkey is None:
 
-            self.image = self.background.copy()
+            image = planes.SURFACE_POOL.reuse(self.image, size, pygame.SRCALPHA)
+
+            # Adding to a transparent Surface copies the pixels exactly,
+            # like Surface.copy()
+            #
+            image.fill((0, 0, 0, 0))
+            image.blit(self.background, (0, 0), special_flags = pygame.BLEND_RGBA_ADD)
 
         else:
 
             # Use colorkey color as background, and switch from alpha usage
             # to color keying
 
-            self.image = pygame.Surface(self.background.get_rect().size)
-            self.image.convert()
-            self.image.fill(self.colorkey)
-            self.image.blit(self.background, (0, 0))
-            self.image.set_colorkey(self.colorkey, pygame.RLEACCEL)
-
-        self.rendersurface = self.image.copy()
-
-        return
-
-    def remove(self, plane_identifier):
-        """Remove the subplane, then reposition remaining subplanes and resize the container.
-        """
-
-        # Adapted from gui.Container method
-
-        # Accept Plane name as well as Plane instance
-        #
-        if isinstance(plane_identifier, planes.Plane):
+            image = planes.SURFACE_POOL.reuse(self.image, size)
+            image.fill(self.colorkey)
+            image.blit(self.background, (0, 0))
+            image.set_colorkey(self.colorkey, pygame.RLEACCEL)
 
-            name = plane_identifier.name
+        if image is not self.image:
 
-        else:
-            name = plane_identifier
+            self.image = image
 
-        # Save the height of the removed plane
+        # Force redraw in render(), even if the image is reused
         #
-        height_removed = self.subplanes[name].rect.height + self.padding
+        self.last_image_id = None
 
-        planes.Plane.remove(self, name)
+        return
 
-        # Reposition remaining subplanes.
-        #
-        top = self.style.top_img.get_height()
+    def destroy(self):
+        """Return TMBContainer.background to planes.SURFACE_POOL, then call the base class method.
+        """
 
-        for name in self.subplanes_list:
-            rect = self.subplanes[name].rect
-            rect.top = top
-            top = top + rect.height + self.padding
+        planes.SURFACE_POOL.release(self.background)
 
-        # Now shrink and redraw.
-        #
-        self.rect.height = self.rect.height - height_removed
+        self.background = self._background_style = None
 
-        self.redraw()
+        planes.gui.Container.destroy(self)
 
         return
 
@@ -453,8 +464,12 @@ class TMBFadingContainer(TMBContainer, planes.gui.FadingContainer):
 
         # Copied from planes.gui.FadingContainer.__init__()
         #
+        self.cache_rendering = True
+
         self.display_duration = display_duration
 
         self.alpha_steps = list(range(255, 0, -int(255 / fade_duration)))
 
+        self.alpha = None
+
         return
@@ -0,0 +1,392 @@
+"""telemetry - Live performance statistics of planes over a local socket.
+
+   Copyright 2013 by Florian Berger <fberger@florian-berger.de>
+
+   A TelemetryServer streams the statistics of every frame rendered by a
+   Display to connected clients, as one JSON object per line. Sampling
+   only copies a few numbers on the main thread. Encoding and all socket
+   I/O happen in a background thread.
+
+   Usage:
+
+   >>> display = planes.Display((300, 300))
+   >>> display.telemetry = TelemetryServer(("127.0.0.1", 8765))
+   >>> display.telemetry.start()
+
+   Then run the bundled dashboard in a terminal:
+
+   python -m planes.telemetry 127.0.0.1:8765
+
+   Give a file system path instead of a (host, port) tuple to use a Unix
+   domain socket.
+"""
+
+# This file is part of planes.
+#
+# planes is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# planes is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with planes.  If not, see <http://www.gnu.org/licenses/>.
+
+import planes
+import socket
+import select
+import threading
+import json
+import time
+import os
+import sys
+
+try:
+    import queue
+
+except ImportError:
+
+    # Python 2
+    #
+    import Queue as queue
+
+DEFAULT_ADDRESS = ("127.0.0.1", 8765)
+
+class TelemetryServer(object):
+    """A server streaming per-frame planes statistics as newline-delimited JSON.
+
+       Assign an instance to Display.telemetry, and call
+       TelemetryServer.start(). Display.render() will then call
+       TelemetryServer.sample() once per frame.
+
+       Attributes:
+
+       TelemetryServer.address
+           A (host, port) tuple for a TCP socket, or a file system path for
+           a Unix domain socket.
+
+       TelemetryServer.max_queued_samples
+           Samples not yet sent are dropped beyond this number, so a slow
+           client never slows down the render loop.
+
+       TelemetryServer.dropped_samples
+           Number of samples dropped so far.
+
+       TelemetryServer.frame
+           Number of frames sampled so far.
+
+       TelemetryServer.total_planes
+           The number of Planes of the Display, as sent in the last sample.
+           Counted again at most every TelemetryServer.COUNT_INTERVAL
+           seconds, and only when planes.GEOMETRY_VERSION has changed.
+    """
+
+    # Seconds between counts of the Planes of the Display
+    #
+    COUNT_INTERVAL = 1.0
+
+    def __init__(self, address = DEFAULT_ADDRESS, max_queued_samples = 120):
+        """Initialise. Call TelemetryServer.start() to begin serving.
+        """
+
+        self.address = address
+
+        self.max_queued_samples = max_queued_samples
+
+        self.dropped_samples = 0
+
+        self.frame = 0
+
+        self.total_planes = 0
+
+        # Time and planes.GEOMETRY_VERSION of the last count
+        #
+        self._counted_at = None
+
+        self._counted_geometry_version = None
+
+        self._samples = queue.Queue(max_queued_samples)
+
+        self._clients = []
+
+        self._socket = None
+
+        self._thread = None
+
+        self._running = False
+
+        return
+
+    def start(self):
+        """Open the listening socket and start serving in a background thread.
+           Enables planes.STATS until TelemetryServer.stop() is called.
+        """
+
+        if isinstance(self.address, str):
+
+            if os.path.exists(self.address):
+
+                os.remove(self.address)
+
+            self._socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+
+        else:
+            self._socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+
+            self._socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+
+        self._socket.bind(self.address)
+
+        self._socket.listen(5)
+
+        self._running = True
+
+        self._thread = threading.Thread(target = self._serve)
+
+        self._thread.daemon = True
+
+        self._thread.start()
+
+        # Collect per-Plane statistics while serving
+        #
+        planes.STATS.enable(self)
+
+        return
+
+    def stop(self):
+        """Stop serving, and close all sockets.
+        """
+
+        self._running = False
+
+        planes.STATS.disable(self)
+
+        if self._thread is not None:
+
+            self._thread.join()
+
+            self._thread = None
+
+        return
+
+    def sample(self, display):
+        """Queue the statistics of the current frame for sending.
+           Called from Display.render(). Does nothing while no client is
+           connected. Never blocks.
+
+           STATS.total_planes is only counted for the statistics overlay,
+           so the Planes of display are counted here, see
+           TelemetryServer.total_planes.
+        """
+
+        self.frame += 1
+
+        if not self._clients:
+
+            return
+
+        now = time.time()
+
+        # Counting walks the whole tree, so do it only now and then
+        #
+        if (self._counted_at is None
+            or (planes.GEOMETRY_VERSION != self._counted_geometry_version
+                and now - self._counted_at >= self.COUNT_INTERVAL)):
+
+            self.total_planes = display.count_planes()
+
+            self._counted_at = now
+
+            self._counted_geometry_version = planes.GEOMETRY_VERSION
+
+        stats = planes.STATS
+
+        composite_blits = stats.composite_cache_hits + stats.composite_cache_misses
+
+        composite_cache_hit_rate = None
+
+        if composite_blits:
+
+            composite_cache_hit_rate = stats.composite_cache_hits / float(composite_blits)
+
+        sample = {"frame": self.frame,
+                  "time": now,
+                  "frame_time": stats.frame_time,
+                  "update_time": stats.update_time,
+                  "render_time": stats.render_time,
+                  "mean_render_time": stats.mean_render_time,
+                  "updated_planes": stats.updated_planes,
+                  "total_planes": self.total_planes,
+                  "culled_planes": stats.culled_planes,
+                  "unconverted_blits": stats.unconverted_blits,
+                  "surface_allocations": stats.surface_allocations,
+                  "dirty_rects": stats.dirty_rects,
+                  "dirty_pixels": stats.dirty_pixels,
+                  "display_pixels": display.rect.width * display.rect.height,
+                  "composite_cache_hit_rate": composite_cache_hit_rate,
+                  "slowest_planes": stats.slowest_planes,
+                  "dropped_samples": self.dropped_samples}
+
+        try:
+            self._samples.put_nowait(sample)
+
+        except queue.Full:
+
+            self.dropped_samples += 1
+
+        return
+
+    def _serve(self):
+        """Accept clients and send queued samples to them, until TelemetryServer.stop() is called.
+           Runs in the background thread.
+        """
+
+        while self._running:
+
+            readable = select.select([self._socket], [], [], 0.05)[0]
+
+            if readable:
+
+                client = self._socket.accept()[0]
+
+                # Drop clients that do not keep up
+                #
+                client.settimeout(1.0)
+
+                self._clients.append(client)
+
+            while True:
+
+                try:
+                    sample = self._samples.get_nowait()
+
+                except queue.Empty:
+
+                    break
+
+                line = (json.dumps(sample, sort_keys = True) + "\n").encode("utf-8")
+
+                for client in list(self._clients):
+
+                    try:
+                        client.sendall(line)
+
+                    except (socket.error, socket.timeout):
+
+                        client.close()
+
+                        self._clients.remove(client)
+
+        for client in self._clients:
+
+            client.close()
+
+        self._clients = []
+
+        self._socket.close()
+
+        if isinstance(self.address, str) and os.path.exists(self.address):
+
+            os.remove(self.address)
+
+        return
+
+def parse_address(address_string):
+    """Return a (host, port) tuple for "host:port", or the string given as a Unix socket path.
+    """
+
+    host, separator, port = address_string.rpartition(":")
+
+    if separator and port.isdigit():
+
+        return (host or "127.0.0.1", int(port))
+
+    return address_string
+
+def format_dashboard(sample):
+    """Return a multi-line string showing the sample given.
+    """
+
+    lines = ["planes {0} telemetry, frame {1}".format(planes.VERSION, sample["frame"]),
+             "",
+             "Frame time:    {0:8.2f} ms".format(sample["frame_time"] * 1000),
+             "Update time:   {0:8.2f} ms".format(sample["update_time"] * 1000),
+             "Render time:   {0:8.2f} ms, mean {1:.2f} ms".format(sample["render_time"] * 1000,
+                                                                 sample["mean_render_time"] * 1000),
+             "Planes:        {0} updated, {1} culled, {2} total".format(sample["updated_planes"],
+                                                                     sample["culled_planes"],
+                                                                     sample["total_planes"]),
+             "Dirty area:    {0} rects, {1:.1f} % of the display".format(sample["dirty_rects"],
+                                                                        100.0 * sample["dirty_pixels"] / max(1, sample["display_pixels"])),
+             "Unconverted:   {0} blits".format(sample["unconverted_blits"]),
+             "Allocations:   {0} surfaces".format(sample["surface_allocations"])]
+
+    if sample["composite_cache_hit_rate"] is not None:
+
+        lines.append("Cache hits:    {0:.1f} %".format(sample["composite_cache_hit_rate"] * 100))
+
+    lines.append("Dropped:       {0} samples".format(sample["dropped_samples"]))
+
+    lines.append("")
+
+    lines.append("Slowest planes, mean render time:")
+
+    for render_time, name, subplane_count in sample["slowest_planes"]:
+
+        lines.append("    {0}: {1:.2f} ms ({2} subplanes)".format(name, render_time, subplane_count))
+
+    return "\n".join(lines)
+
+def main():
+    """Connect to a TelemetryServer and show a live dashboard in the terminal.
+       Usage: python -m planes.telemetry [HOST:PORT | PATH]
+    """
+
+    address = DEFAULT_ADDRESS
+
+    if len(sys.argv) > 1:
+
+        address = parse_address(sys.argv[1])
+
+    if isinstance(address, str):
+
+        connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+
+    else:
+        connection = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+
+    connection.connect(address)
+
+    last_drawn = 0
+
+    try:
+        for line in connection.makefile("r"):
+
+            # Redraw at most 4 times per second
+            #
+            if time.time() - last_drawn < 0.25:
+
+                continue
+
+            last_drawn = time.time()
+
+            # Clear screen, cursor to home position
+            #
+            sys.stdout.write("\033[2J\033[H" + format_dashboard(json.loads(line)) + "\n")
+
+            sys.stdout.flush()
+
+    except KeyboardInterrupt:
+
+        pass
+
+    connection.close()
+
+    return
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,338 @@
+"""trace - Record per-Plane spans and export them in Chrome trace format.
+
+   Copyright 2013 by Florian Berger <fberger@florian-berger.de>
+
+   While a Tracer is recording, Display.process(), event handling,
+   click and drop callbacks, update() and render() of every Plane class
+   are wrapped to record nested spans, carrying the full path of the
+   Plane, like "display/dialog/ok_button". Nothing is wrapped while no
+   Tracer is recording.
+
+   The recording is written as Chrome trace event JSON, which can be
+   loaded into chrome://tracing, Perfetto or speedscope.
+
+   Usage:
+
+   >>> tracer = Tracer("slow_frame.json")
+   >>> tracer.start(frames = 10)
+
+   After the next 10 calls to Display.render(), the trace is written to
+   slow_frame.json. Pressing F11 in a Display does the same for
+   Display.trace_frames frames, see Display.process().
+"""
+
+# This file is part of planes.
+#
+# planes is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# planes is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with planes.  If not, see <http://www.gnu.org/licenses/>.
+
+import planes
+import json
+import os
+import threading
+
+# Methods wrapped in planes.Plane and all of its subclasses that define
+# them
+#
+TRACED_METHODS = ("process",
+                  "update",
+                  "render",
+                  "clicked",
+                  "dropped_upon",
+                  "mouseover_callback",
+                  "mouseout_callback",
+                  "keydown")
+
+# Callback attributes of planes.Plane whose calls are recorded
+#
+TRACED_CALLBACKS = ("left_click_callback",
+                    "right_click_callback",
+                    "up_click_callback",
+                    "down_click_callback",
+                    "dropped_upon_callback")
+
+# The Tracer currently recording, if any
+#
+ACTIVE_TRACER = None
+
+def plane_path(plane):
+    """Return the names of plane and all of its parents, joined by "/".
+    """
+
+    names = []
+
+    while plane is not None:
+
+        names.append(str(plane.name))
+
+        plane = plane.parent
+
+    names.reverse()
+
+    return "/".join(names)
+
+def plane_classes():
+    """Return a list of planes.Plane and all of its subclasses.
+    """
+
+    classes = [planes.Plane]
+
+    index = 0
+
+    while index < len(classes):
+
+        for subclass in classes[index].__subclasses__():
+
+            if subclass not in classes:
+
+                classes.append(subclass)
+
+        index += 1
+
+    return classes
+
+class Tracer(object):
+    """A Tracer records spans for a number of frames and exports them as Chrome trace events.
+
+       Attributes:
+
+       Tracer.filename
+           If not None, the trace is written to this file when recording
+           stops.
+
+       Tracer.events
+           A list of Chrome trace event dicts recorded so far.
+
+       Tracer.frames_left
+           Number of calls to Display.render() until recording stops.
+
+       Tracer.recording
+           Boolean flag, True while recording.
+    """
+
+    def __init__(self, filename = None):
+        """Initialise. Call Tracer.start() to begin recording.
+        """
+
+        self.filename = filename
+
+        self.events = []
+
+        self.frames_left = 0
+
+        self.recording = False
+
+        self._start_time = 0
+
+        self._frame = 0
+
+        # A list of (class, attribute name, original value) tuples
+        #
+        self._patched = []
+
+        return
+
+    def start(self, frames = 60):
+        """Start recording for the number of frames given, i.e. calls to Display.render().
+           Raises a RuntimeError if another Tracer is recording.
+        """
+
+        global ACTIVE_TRACER
+
+        if ACTIVE_TRACER is not None:
+
+            raise RuntimeError("Tracer already recording")
+
+        ACTIVE_TRACER = self
+
+        self.frames_left = frames
+
+        self.recording = True
+
+        self._start_time = planes.PROFILING_TIMER_FUNC()
+
+        for plane_class in plane_classes():
+
+            for name in TRACED_METHODS:
+
+                if name in plane_class.__dict__:
+
+                    original = plane_class.__dict__[name]
+
+                    label = "{0}.{1}".format(plane_class.__name__, name)
+
+                    if plane_class is planes.Display and name == "render":
+
+                        wrapper = self._wrap_frame(original, label)
+
+                    else:
+                        wrapper = self._wrap(original, label)
+
+                    self._patched.append((plane_class, name, original))
+
+                    setattr(plane_class, name, wrapper)
+
+        for name in TRACED_CALLBACKS:
+
+            original = planes.Plane.__dict__[name]
+
+            self._patched.append((planes.Plane, name, original))
+
+            setattr(planes.Plane, name, self._wrap_callback_property(original, name))
+
+        return
+
+    def stop(self):
+        """Stop recording, restore all wrapped methods, and write the trace if Tracer.filename is set.
+        """
+
+        global ACTIVE_TRACER
+
+        if not self.recording:
+
+            return
+
+        # Restore in reverse order
+        #
+        while self._patched:
+
+            plane_class, name, original = self._patched.pop()
+
+            setattr(plane_class, name, original)
+
+        # STATS may have been enabled or disabled while recording
+        #
+        planes._instrument_planes(planes.STATS.enabled)
+
+        self.recording = False
+
+        ACTIVE_TRACER = None
+
+        if self.filename is not None:
+
+            self.export(self.filename)
+
+        return
+
+    def export(self, filename):
+        """Write the events recorded to filename, in Chrome trace event JSON format.
+        """
+
+        with open(filename, "w") as trace_file:
+
+            json.dump({"traceEvents": self.events,
+                       "displayTimeUnit": "ms"},
+                      trace_file)
+
+        return
+
+    def add_span(self, name, plane, start, end):
+        """Record a span called name for plane, from start to end as returned by planes.PROFILING_TIMER_FUNC.
+        """
+
+        self.events.append({"name": name,
+                            "cat": "planes",
+                            "ph": "X",
+                            "ts": (start - self._start_time) / 1000.0,
+                            "dur": (end - start) / 1000.0,
+                            "pid": os.getpid(),
+                            "tid": threading.current_thread().ident,
+                            "args": {"path": plane_path(plane)}})
+
+        return
+
+    def _wrap(self, function, label):
+        """Return a function that calls function and records a span called label.
+        """
+
+        tracer = self
+
+        def traced(plane, *args, **kwargs):
+            """Call the original method and record a span.
+            """
+
+            start = planes.PROFILING_TIMER_FUNC()
+
+            try:
+                return function(plane, *args, **kwargs)
+
+            finally:
+                tracer.add_span(label, plane, start, planes.PROFILING_TIMER_FUNC())
+
+        traced.__doc__ = function.__doc__
+
+        return traced
+
+    def _wrap_frame(self, function, label):
+        """Like Tracer._wrap(), but count frames and stop recording after the last one.
+        """
+
+        tracer = self
+
+        traced = self._wrap(function, label)
+
+        def traced_frame(display, *args, **kwargs):
+            """Call the original method, record a span and count the frame.
+            """
+
+            tracer._frame += 1
+
+            tracer.events.append({"name": "frame {0}".format(tracer._frame),
+                                  "cat": "planes",
+                                  "ph": "i",
+                                  "s": "g",
+                                  "ts": (planes.PROFILING_TIMER_FUNC() - tracer._start_time) / 1000.0,
+                                  "pid": os.getpid(),
+                                  "tid": threading.current_thread().ident})
+
+            try:
+                return traced(display, *args, **kwargs)
+
+            finally:
+                tracer.frames_left -= 1
+
+                if tracer.frames_left <= 0:
+
+                    tracer.stop()
+
+        traced_frame.__doc__ = function.__doc__
+
+        return traced_frame
+
+    def _wrap_callback_property(self, original, name):
+        """Return a property like original, whose getter returns callbacks wrapped to record a span called name.
+        """
+
+        tracer = self
+
+        def get_callback(plane):
+
+            callback = original.fget(plane)
+
+            if callback is None:
+
+                return None
+
+            def traced_callback(*args, **kwargs):
+
+                start = planes.PROFILING_TIMER_FUNC()
+
+                try:
+                    return callback(*args, **kwargs)
+
+                finally:
+                    tracer.add_span(name, plane, start, planes.PROFILING_TIMER_FUNC())
+
+            return traced_callback
+
+        return property(get_callback, original.fset)